@@ -6,6 +6,8 @@ from django.utils.encoding import python_2_unicode_compatible
 from django.utils.safestring import mark_safe
 from django.urls import reverse
 
+from permissions import cache as perms_cache
+
 
 __all__ = ['User', 'Group', 'Team']
 
@@ -29,9 +31,21 @@ class User(AbstractUser):
             default=NOTIFICATIONS_OTHERS)
 
     @property
-    def teams(self):
+    def team_ids(self):
+        """
+        Set of the ids of the teams the user belongs to, directly or through
+        a group, cached until a membership changes.
+        """
+        if self.pk is None:
+            return set()
         query = Q(groups__in=self.groups.all()) | Q(users=self)
-        return Team.objects.filter(query).distinct()
+        return perms_cache.get_user_value(self, 'teams',
+                lambda: set(Team.objects.filter(query).order_by()
+                        .values_list('id', flat=True)))
+
+    @property
+    def teams(self):
+        return Team.objects.filter(id__in=self.team_ids)
 
     @property
     def username_and_fullname(self):
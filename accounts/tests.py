@@ -390,3 +390,21 @@ class TestModels(TestCase):
         self.assertEqual(user.username_and_fullname, 'user (Firstname Lastname)')
         user.first_name = ''
         self.assertEqual(user.username_and_fullname, 'user (Lastname)')
+
+    def test_user_teams(self):
+        user = User.objects.create(username='user')
+        group = Group.objects.create(name='group')
+        team1 = Team.objects.create(name='team1')
+        team2 = Team.objects.create(name='team2')
+        self.assertEqual(user.team_ids, set())
+        team1.users.add(user)
+        self.assertEqual(user.team_ids, {team1.id})
+        team2.groups.add(group)
+        self.assertEqual(user.team_ids, {team1.id})
+        user.groups.add(group)
+        self.assertEqual(user.team_ids, {team1.id, team2.id})
+        with self.assertNumQueries(0):
+            self.assertEqual(user.team_ids, {team1.id, team2.id})
+        self.assertEqual(list(user.teams), [team1, team2])
+        team1.users.remove(user)
+        self.assertEqual(user.team_ids, {team2.id})
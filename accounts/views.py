@@ -6,7 +6,7 @@ from django.views.decorators.http import require_http_methods
 from django.contrib import messages
 from django.db.models import Q
 from django.core.exceptions import ObjectDoesNotExist
-from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
+from django.core.paginator import PageNotAnInteger, EmptyPage
 from django.conf import settings
 from django.contrib.auth.forms import PasswordChangeForm
 from django.forms.models import modelform_factory
@@ -15,6 +15,8 @@ from django.http import Http404, HttpResponse
 from django.http import JsonResponse
 
 from permissions.decorators import project_perm_required
+from tracker.utils import Paginator
+from tracker import cache as tracker_cache
 
 from accounts.models import *
 from accounts.forms import *
@@ -61,7 +63,8 @@ def profile(request):
 @project_perm_required('manage_accounts')
 def user_list(request):
     paginator = Paginator(User.objects.all(),
-            get_current_site(request).settings.items_per_page)
+            get_current_site(request).settings.items_per_page,
+            version=tracker_cache.get_version('accounts'))
     page = request.GET.get('page')
     try:
         users = paginator.page(page)
@@ -71,6 +74,7 @@ def user_list(request):
         users = paginator.page(paginator.num_pages)
     return render(request, 'accounts/user_list.html', {
         'users': users,
+        'paginator': paginator,
         'external_auth': settings.EXTERNAL_AUTH,
     })
 
@@ -284,7 +288,8 @@ def user_remove_team(request, user, team):
 @project_perm_required('manage_accounts')
 def group_list(request):
     paginator = Paginator(Group.objects.all(),
-            get_current_site(request).settings.items_per_page)
+            get_current_site(request).settings.items_per_page,
+            version=tracker_cache.get_version('accounts'))
     page = request.GET.get('page')
     try:
         groups = paginator.page(page)
@@ -401,7 +406,8 @@ def group_remove_user(request, group, user):
 @project_perm_required('manage_accounts')
 def team_list(request):
     paginator = Paginator(Team.objects.all(),
-            get_current_site(request).settings.items_per_page)
+            get_current_site(request).settings.items_per_page,
+            version=tracker_cache.get_version('accounts'))
     page = request.GET.get('page')
     try:
         teams = paginator.page(page)
@@ -1,29 +1,152 @@
 from django.contrib.auth.backends import ModelBackend
 
+from functools import reduce
+import operator
+
+from django.db.models import Q
+
 from tracker.models import Project
-from permissions.models import GlobalPermission
+from accounts.models import User, Team
+from permissions.models import GlobalPermission, ProjectPermission
+from permissions.models import PermissionModel as PermModel
+from permissions.models import PERMISSIONS, perm_bit
+from permissions import cache as perms_cache
+
+
+__all__ = ['Backend', 'users_with_perm', 'users_with_access',
+           'get_users_with_access']
+
+
+def merge_perms(queryset):
+    return reduce(operator.or_, queryset.values_list('perms', flat=True), 0)
+
+
+def get_grantees_query(grants):
+    """
+    Build a query on users matching the given (grantee_type, grantee_id)
+    pairs, expanding groups and teams.
+    """
+    ids = {
+        PermModel.GRANTEE_USER: set(),
+        PermModel.GRANTEE_GROUP: set(),
+        PermModel.GRANTEE_TEAM: set(),
+    }
+    for grantee_type, grantee_id in grants:
+        ids[grantee_type].add(grantee_id)
+    teams = ids[PermModel.GRANTEE_TEAM]
+    query = Q(pk__in=ids[PermModel.GRANTEE_USER])
+    query |= Q(groups__in=ids[PermModel.GRANTEE_GROUP])
+    if teams:
+        query |= Q(pk__in=Team.users.through.objects
+                .filter(team__in=teams).values('user'))
+        query |= Q(groups__in=Team.groups.through.objects
+                .filter(team__in=teams).values('group'))
+    return query
+
+
+def users_with_perm(perm, project=None):
+    """
+    Return the set of the ids of the users holding the permission, globally
+    or on the project, whether it is granted directly, through a group or
+    through a team. Active superusers hold every permission.
+
+    This costs three queries whatever the number of users and grantees.
+    """
+    if perm not in PERMISSIONS:
+        return set()
+    fields = ('grantee_type', 'grantee_id')
+    grants = list(GlobalPermission.objects.granting(perm)
+            .values_list(*fields))
+    if project is not None:
+        grants += list(ProjectPermission.objects.filter(project=project)
+                .granting(perm).values_list(*fields))
+    query = get_grantees_query(grants)
+    query |= Q(is_superuser=True, is_active=True)
+    return set(User.objects.filter(query).values_list('id', flat=True))
+
 
+def get_users_with_access(project):
+    """
+    Return the queryset of the users who can access the project, following
+    the same rules as tracker.utils.granted_project_ids, to be used as a
+    subquery.
 
-def user_has_perm(user, perm, perms):
-    for p in perms:
-        # this perm allow that action and the user is concerned by this perm
-        if perm in p.all_perms and getattr(p, perm) and p.granted_to(user):
-            return True
+    This costs two queries, for the grants, whatever the number of users
+    and grantees.
+    """
+    if project.access != Project.ACCESS_PRIVATE:
+        return User.objects.all()
+    fields = ('grantee_type', 'grantee_id')
+    grants = list(GlobalPermission.objects.granting('access_project')
+            .values_list(*fields))
+    # any permission on the project allows access to it
+    grants += list(ProjectPermission.objects.filter(project=project)
+            .values_list(*fields))
+    query = get_grantees_query(grants)
+    query |= Q(is_staff=True)
+    return User.objects.filter(query)
+
+
+def users_with_access(project):
+    """
+    Return the set of the ids of the users who can access the project, see
+    get_users_with_access.
+
+    This costs three queries whatever the number of users and grantees.
+    """
+    return set(get_users_with_access(project).values_list('id', flat=True))
 
 
 class Backend(ModelBackend):
 
+    def get_perms_bits(self, user, project=None):
+        """
+        Return the bitset of the permissions the user has on the project
+        (or globally if project is None).
+
+        Bitsets are shared between processes through permissions.cache and
+        memoized on the user object, which lives as long as the request, so
+        that each (user, project) pair costs at most a fixed number of
+        queries whatever the number of permission checks.
+        """
+
+        if not user.is_authenticated:
+            return 0
+
+        version, key, cache = getattr(user, '_ponytracker_perms',
+                (None, None, None))
+        local_version = perms_cache.versions.local
+        if version != local_version:
+            key, cache = perms_cache.get_user_entry(user, 'perms')
+            if cache is None:
+                cache = {}
+            user._ponytracker_perms = (local_version, key, cache)
+
+        if project is None:
+            pk = None
+        else:
+            pk = project.pk
+
+        if pk not in cache:
+            if None not in cache:
+                cache[None] = merge_perms(
+                    GlobalPermission.objects.granted_to(user))
+            if project is not None:
+                cache[pk] = cache[None] | merge_perms(
+                    ProjectPermission.objects.filter(project=project)
+                    .granted_to(user))
+            perms_cache.set_user_entry(key, cache)
+
+        return cache[pk]
+
     def has_perm(self, user, perm, obj=None):
 
-        if isinstance(obj, Project):
-            # get permissions concerning this project
-            perms = obj.permissions.all()
-            if user_has_perm(user, perm, perms):
-                return True
+        if perm not in PERMISSIONS:
+            return False
 
-        # get global permissions
-        perms = GlobalPermission.objects.all()
-        if user_has_perm(user, perm, perms):
-            return True
+        if isinstance(obj, Project):
+            bits = self.get_perms_bits(user, obj)
+        else:
+            bits = self.get_perms_bits(user)
 
-        return False
+        return bool(bits & perm_bit(perm))
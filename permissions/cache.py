@@ -0,0 +1,64 @@
+from tracker.cache import Versions
+
+
+__all__ = ['get_version', 'invalidate_perms', 'get_user_entry',
+           'set_user_entry', 'get_user_value']
+
+
+"""
+Resolved permissions are shared between processes through Django's cache
+framework (the cache alias is given by the PERMISSIONS_CACHE setting).
+
+Every entry is keyed by a global permission version stored in the cache
+itself: bumping it invalidates all the entries at once, outdated ones being
+left to expire. Objects memoizing permissions for the duration of a request
+also check the local version, see tracker.cache.Versions.
+"""
+
+
+versions = Versions('permissions', 'PERMISSIONS_CACHE')
+
+
+def get_cache():
+    return versions.get_cache()
+
+
+def get_version():
+    return versions.get(versions.get_key())
+
+
+def invalidate_perms():
+    versions.invalidate(versions.get_key())
+
+
+def get_user_key(user, name, version):
+    return 'permissions:%s:%s:%s' % (version, user.pk, name)
+
+
+def get_user_entry(user, name):
+    """
+    Return a (key, value) tuple for the named entry of the user, the value
+    being None if not cached. The key must be given back to set_user_entry.
+    """
+    key = get_user_key(user, name, get_version())
+    return key, get_cache().get(key)
+
+
+def set_user_entry(key, value):
+    get_cache().set(key, value)
+
+
+def get_user_value(user, name, compute):
+    """
+    Return the named entry of the user, computing and caching it if needed.
+    The value is also memoized on the user object for the rest of the request.
+    """
+    attr = '_ponytracker_%s' % name
+    version, value = getattr(user, attr, (None, None))
+    if version != versions.local:
+        key, value = get_user_entry(user, name)
+        if value is None:
+            value = compute()
+            set_user_entry(key, value)
+        setattr(user, attr, (versions.local, value))
+    return value
@@ -1,14 +1,47 @@
+from django.contrib.auth import get_backends
+
 from tracker.models import Project
+from permissions.models import PERMISSIONS, perm_bit
 
 
 class PermWrapper:
 
+    """
+    Give templates access to the permissions of the user on the project.
+
+    Permissions granted by the configured backends able to give them all at
+    once (see permissions.backends.Backend.get_perms_bits) are loaded on the
+    first lookup. Other lookups are left to user.has_perm, which asks every
+    backend, their results being kept for the next lookups. `hits` counts
+    the calls made to the backends, for debugging purpose.
+    """
+
     def __init__(self, user, project):
         self.user = user
         self.project = project
+        self.perms = None
+        self.hits = 0
+
+    def load(self):
+        self.hits += 1
+        if self.user.is_active and self.user.is_superuser:
+            self.perms = dict((perm, True) for perm in PERMISSIONS)
+            return
+        bits = 0
+        for backend in get_backends():
+            if hasattr(backend, 'get_perms_bits'):
+                bits |= backend.get_perms_bits(self.user, self.project)
+        self.perms = dict((perm, True) for perm in PERMISSIONS
+                if bits & perm_bit(perm))
 
     def __getitem__(self, perm):
-        return self.user.has_perm(perm, self.project)
+        if self.perms is None:
+            self.load()
+        if perm not in self.perms:
+            # not granted by the bits, ask all the backends
+            self.hits += 1
+            self.perms[perm] = self.user.has_perm(perm, self.project)
+        return self.perms[perm]
 
     def __iter__(self):
         raise TypeError("PermWrapper is not iterable.")
@@ -31,22 +31,22 @@ class PermissionForm(forms.ModelForm):
         name = data['grantee_name']
 
         if int(data['grantee_type']) == PermissionModel.GRANTEE_USER:
-            grantees = User.objects.filter(username=name)
-            if not grantees.exists():
+            grantee = User.objects.filter(username=name).first()
+            if not grantee:
                 raise ValidationError("User '%s' does not exists." % name)
         elif int(data['grantee_type']) == PermissionModel.GRANTEE_GROUP:
-            grantees = Group.objects.filter(name=name)
-            if not grantees.exists():
+            grantee = Group.objects.filter(name=name).first()
+            if not grantee:
                 raise ValidationError("Group '%s' does not exists." % name)
         elif int(data['grantee_type']) == PermissionModel.GRANTEE_TEAM:
-            grantees = Team.objects.filter(name=name)
-            if not grantees.exists():
+            grantee = Team.objects.filter(name=name).first()
+            if not grantee:
                 raise ValidationError("Team '%s' does not exists." % name)
         else:
             # grantee_type is not in choice set, an error will be reported
             return data
 
-        data['grantee_id'] = grantees.first().id
+        data['grantee_id'] = grantee.id
 
         return data
 
@@ -0,0 +1,31 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from permissions.matrix import PermissionMatrix
+
+
+class Command(BaseCommand):
+    help = 'Export the effective permissions of all users on all projects'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['csv', 'npz'],
+                default='csv', help='Output format (default: csv)')
+        parser.add_argument('--output', '-o',
+                help='Output file (default: standard output, csv only)')
+
+    def handle(self, *args, **options):
+        if options['format'] == 'npz' and not options['output']:
+            raise CommandError("The npz format requires an output file.")
+        try:
+            matrix = PermissionMatrix()
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+        if options['format'] == 'npz':
+            with open(options['output'], 'wb') as f:
+                matrix.save_npz(f)
+        elif options['output']:
+            with open(options['output'], 'w') as f:
+                f.writelines(matrix.iter_csv())
+        else:
+            for chunk in matrix.iter_csv():
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,199 @@
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from tracker.models import Project
+from accounts.models import User, Group, Team
+from permissions.models import GlobalPermission, ProjectPermission
+from permissions.models import PermissionModel as PermModel
+from permissions.models import PERMISSIONS
+
+
+__all__ = ['PermissionMatrix']
+
+
+"""
+Effective permissions of every user on every project, as computed by
+User.has_perm, but resolved for all users at once with NumPy array
+operations instead of one has_perm call per cell.
+
+NumPy is an optional dependency, only required by the export.
+"""
+
+
+# Rows processed at once by the boolean matrix products and the unpacking of
+# the bitmasks, to bound the memory used by their temporary arrays.
+CHUNK_SIZE = 512
+
+
+def bool_matmul(a, b):
+    """
+    Boolean matrix product: result[i, j] is true if a[i, k] and b[k, j] are
+    both true for some k.
+    """
+    b = b.astype(np.float32)
+    result = np.empty((a.shape[0], b.shape[1]), dtype=bool)
+    for start in range(0, a.shape[0], CHUNK_SIZE):
+        chunk = a[start:start + CHUNK_SIZE].astype(np.float32)
+        result[start:start + CHUNK_SIZE] = np.dot(chunk, b) > 0
+    return result
+
+
+def unpack_bits(bits):
+    """
+    Unpack an integer array of permission bitmasks along a new last axis of
+    booleans, one bit of a chunk of rows at a time.
+    """
+    result = np.empty(bits.shape + (len(PERMISSIONS),), dtype=bool)
+    for start in range(0, bits.shape[0], CHUNK_SIZE):
+        chunk = bits[start:start + CHUNK_SIZE]
+        for bit in range(len(PERMISSIONS)):
+            np.not_equal(chunk & (1 << bit), 0,
+                         out=result[start:start + CHUNK_SIZE, ..., bit])
+    return result
+
+
+def index_of(ids):
+    return dict((id, index) for index, id in enumerate(ids))
+
+
+def membership(pairs, rows, cols):
+    """
+    Boolean matrix from (row id, column id) pairs, given the index of each
+    row and column id.
+    """
+    matrix = np.zeros((len(rows), len(cols)), dtype=bool)
+    for row, col in pairs:
+        if row in rows and col in cols:
+            matrix[rows[row], cols[col]] = True
+    return matrix
+
+
+def csv_field(value):
+    if any(c in value for c in ',"\r\n'):
+        return '"%s"' % value.replace('"', '""')
+    return value
+
+
+def csv_line(values):
+    return ','.join([csv_field(value) for value in values]) + '\n'
+
+
+class PermissionMatrix:
+
+    """
+    Load all permissions and memberships in a fixed number of queries and
+    compute the users x projects x permissions boolean matrix.
+    """
+
+    def __init__(self):
+
+        if np is None:
+            raise ImproperlyConfigured("NumPy is required to compute "
+                                       "the permission matrix.")
+
+        users = list(User.objects.order_by('id').values_list(
+            'id', 'username', 'is_active', 'is_superuser'))
+        projects = list(Project.objects.order_by('id')
+                .values_list('id', 'name'))
+        self.users = [user[1] for user in users]
+        self.projects = [project[1] for project in projects]
+        self.permissions = list(PERMISSIONS)
+
+        user_index = index_of([user[0] for user in users])
+        project_index = index_of([project[0] for project in projects])
+        group_index = index_of(Group.objects.values_list('id', flat=True))
+        team_index = index_of(Team.objects.values_list('id', flat=True))
+
+        # memberships
+        user_groups = membership(User.groups.through.objects
+                .values_list('user_id', 'group_id'), user_index, group_index)
+        user_teams = membership(Team.users.through.objects
+                .values_list('user_id', 'team_id'), user_index, team_index)
+        team_groups = membership(Team.groups.through.objects
+                .values_list('team_id', 'group_id'), team_index, group_index)
+        # teams reached through a group
+        user_teams |= bool_matmul(user_groups, team_groups.T)
+
+        grantees = {
+            PermModel.GRANTEE_USER: (user_index, None),
+            PermModel.GRANTEE_GROUP: (group_index, user_groups),
+            PermModel.GRANTEE_TEAM: (team_index, user_teams),
+        }
+
+        # global permissions, as bitmasks per grantee (32 bits, like the
+        # perms column)
+        global_bits = dict((grantee_type, np.zeros(len(index), np.int32))
+                for grantee_type, (index, _) in grantees.items())
+        for grantee_type, grantee_id, perms in GlobalPermission.objects \
+                .values_list('grantee_type', 'grantee_id', 'perms'):
+            index = grantees[grantee_type][0]
+            if grantee_id in index:
+                global_bits[grantee_type][index[grantee_id]] |= perms
+
+        # project permissions, as bitmasks per grantee and project
+        project_bits = {}
+        for grantee_type, (index, _) in grantees.items():
+            project_bits[grantee_type] = np.zeros(
+                (len(index), len(project_index)), np.int32)
+        for project_id, grantee_type, grantee_id, perms in \
+                ProjectPermission.objects.values_list('project_id',
+                    'grantee_type', 'grantee_id', 'perms'):
+            index = grantees[grantee_type][0]
+            if grantee_id in index and project_id in project_index:
+                project_bits[grantee_type][index[grantee_id],
+                        project_index[project_id]] |= perms
+
+        # users x permissions
+        perms = unpack_bits(global_bits[PermModel.GRANTEE_USER])
+        # users x projects x permissions
+        matrix = unpack_bits(project_bits[PermModel.GRANTEE_USER])
+        for grantee_type in (PermModel.GRANTEE_GROUP, PermModel.GRANTEE_TEAM):
+            members = grantees[grantee_type][1]
+            perms |= bool_matmul(members,
+                    unpack_bits(global_bits[grantee_type]))
+            granted = unpack_bits(project_bits[grantee_type])
+            granted = granted.reshape(granted.shape[0], -1)
+            matrix |= bool_matmul(members, granted).reshape(matrix.shape)
+        # global permissions apply on every project
+        matrix |= perms[:, np.newaxis, :]
+
+        # active superusers have all permissions
+        superusers = [user_index[user[0]] for user in users
+                if user[2] and user[3]]
+        matrix[superusers] = True
+
+        self.matrix = matrix
+
+    def iter_csv(self):
+        """
+        Yield the matrix as CSV, by chunks of one line per project for each
+        user. Permission cells are formatted with array operations as the
+        csv module is far too slow for millions of lines.
+        """
+        yield csv_line(['user', 'project'] + self.permissions)
+        projects = [csv_field(project) for project in self.projects]
+        size = len(self.permissions)
+        # ",0,1,...,1\n" for each project
+        cells = np.empty((len(projects), 2 * size + 1), dtype=np.uint8)
+        cells[:, 0:-1:2] = ord(',')
+        cells[:, -1] = ord('\n')
+        for i, user in enumerate(self.users):
+            user = csv_field(user)
+            cells[:, 1:-1:2] = self.matrix[i].view(np.uint8) + ord('0')
+            lines = cells.tobytes().decode('ascii').splitlines(True)
+            yield ''.join(['%s,%s%s' % (user, project, line)
+                    for project, line in zip(projects, lines)])
+
+    def save_npz(self, file):
+        """
+        Save the matrix and its labels to a compressed .npz file.
+        """
+        np.savez_compressed(file,
+                users=np.array(self.users),
+                projects=np.array(self.projects),
+                permissions=np.array(self.permissions),
+                matrix=self.matrix)
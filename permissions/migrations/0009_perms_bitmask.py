@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+# Frozen copy of permissions.models.PERMISSIONS at the time of this migration.
+PERMISSIONS = (
+    'create_project',
+    'modify_project',
+    'delete_project',
+    'manage_settings',
+    'manage_accounts',
+    'manage_global_permission',
+    'access_project',
+    'create_issue',
+    'modify_issue',
+    'manage_issue',
+    'delete_issue',
+    'create_comment',
+    'modify_comment',
+    'modify_own_comment',
+    'delete_comment',
+    'manage_tags',
+    'delete_tags',
+    'manage_project_permission',
+)
+
+GLOBAL_PERMISSIONS = PERMISSIONS
+
+PROJECT_PERMISSIONS = PERMISSIONS[PERMISSIONS.index('create_issue'):]
+
+
+def pack_perms(apps, schema_editor):
+    for model, perms in (('GlobalPermission', GLOBAL_PERMISSIONS),
+                         ('ProjectPermission', PROJECT_PERMISSIONS)):
+        Model = apps.get_model('permissions', model)
+        for row in Model.objects.values('pk', *perms):
+            mask = 0
+            for perm in perms:
+                if row[perm]:
+                    mask |= 1 << PERMISSIONS.index(perm)
+            Model.objects.filter(pk=row['pk']).update(perms=mask)
+
+
+def unpack_perms(apps, schema_editor):
+    for model, perms in (('GlobalPermission', GLOBAL_PERMISSIONS),
+                         ('ProjectPermission', PROJECT_PERMISSIONS)):
+        Model = apps.get_model('permissions', model)
+        for row in Model.objects.values('pk', 'perms'):
+            values = {}
+            for perm in perms:
+                values[perm] = bool(row['perms'] & 1 << PERMISSIONS.index(perm))
+            Model.objects.filter(pk=row['pk']).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('permissions', '0008_auto_20171122_1227'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='globalpermission',
+            name='perms',
+            field=models.IntegerField(default=1, verbose_name='Permissions'),
+        ),
+        migrations.AddField(
+            model_name='projectpermission',
+            name='perms',
+            field=models.IntegerField(default=0, verbose_name='Permissions'),
+        ),
+        migrations.RunPython(pack_perms, unpack_perms),
+    ] + [
+        migrations.RemoveField(
+            model_name='globalpermission',
+            name=perm,
+        ) for perm in GLOBAL_PERMISSIONS
+    ] + [
+        migrations.RemoveField(
+            model_name='projectpermission',
+            name=perm,
+        ) for perm in PROJECT_PERMISSIONS
+    ]
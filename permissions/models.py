@@ -1,5 +1,5 @@
 from django.db import models
-from django.db.models import Q
+from django.db.models import Q, F
 from django.utils.encoding import python_2_unicode_compatible
 
 from tracker.models import Project
@@ -9,6 +9,88 @@ from accounts.models import *
 __all__ = ['GlobalPermission', 'ProjectPermission']
 
 
+# All permissions are packed in the integer `perms` column, the position of
+# a permission in this tuple being its bit. Project permissions share their
+# bit with the global permission of the same name, so that grants of both
+# kinds can be OR-ed together. Never reorder: only append new permissions.
+PERMISSIONS = (
+    'create_project',
+    'modify_project',
+    'delete_project',
+    'manage_settings',
+    'manage_accounts',
+    'manage_global_permission',
+    'access_project',
+    'create_issue',
+    'modify_issue',
+    'manage_issue',
+    'delete_issue',
+    'create_comment',
+    'modify_comment',
+    'modify_own_comment',
+    'delete_comment',
+    'manage_tags',
+    'delete_tags',
+    'manage_project_permission',
+)
+
+
+def perm_bit(perm):
+    return 1 << PERMISSIONS.index(perm)
+
+
+def perms_mask(*perms):
+    mask = 0
+    for perm in perms:
+        mask |= perm_bit(perm)
+    return mask
+
+
+class PermissionBit(property):
+
+    """
+    Boolean accessor on one bit of the `perms` column, which can be read,
+    assigned and given as keyword argument to the model constructor like
+    the boolean field it used to be.
+    """
+
+    creation_counter = 0
+
+    def __init__(self, verbose_name=None):
+        super(PermissionBit, self).__init__(self._get, self._set)
+        self.verbose_name = verbose_name
+        self.name = None
+        self.bit = 0
+        # keep track of the declaration order, like django fields
+        self.creation_counter = PermissionBit.creation_counter
+        PermissionBit.creation_counter += 1
+
+    def contribute_to_class(self, cls, name):
+        self.name = name
+        self.bit = perm_bit(name)
+        setattr(cls, name, self)
+
+    def _get(self, instance):
+        return bool(instance.perms & self.bit)
+
+    def _set(self, instance, value):
+        if value:
+            instance.perms |= self.bit
+        else:
+            instance.perms &= ~self.bit
+
+
+class GlobalPermissionBit(PermissionBit):
+    pass
+
+
+class ProjectPermissionBit(PermissionBit):
+    pass
+
+
+# Deprecated: the boolean columns of the permissions, before they were packed
+# in the `perms` column. Only kept for the migrations referring to them.
+
 class PermissionField(models.BooleanField):
     pass
 
@@ -21,12 +103,60 @@ class ProjectPermissionField(PermissionField):
     pass
 
 
+def load_grantees(perms):
+    """
+    Resolve the grantees of the given permissions with at most one query
+    per grantee type, and cache them on the permissions.
+    """
+    ids = {}
+    for perm in perms:
+        ids.setdefault(perm.grantee_type, set()).add(perm.grantee_id)
+    grantees = {}
+    for grantee_type, Model in ((PermissionModel.GRANTEE_USER, User),
+                                (PermissionModel.GRANTEE_GROUP, Group),
+                                (PermissionModel.GRANTEE_TEAM, Team)):
+        if grantee_type in ids:
+            grantees[grantee_type] = Model.objects.in_bulk(ids[grantee_type])
+    for perm in perms:
+        grantee = grantees.get(perm.grantee_type, {}).get(perm.grantee_id)
+        if grantee is not None:
+            perm._grantee = grantee
+
+
+class PermissionQuerySet(models.QuerySet):
+
+    def granted_to(self, user):
+        """
+        Filter permissions concerning the user, whether they are granted
+        directly, through a group or through a team, in a single query.
+        """
+        if not user.is_authenticated:
+            return self.none()
+        query = Q(grantee_type=PermissionModel.GRANTEE_USER,
+                grantee_id=user.id)
+        query |= Q(grantee_type=PermissionModel.GRANTEE_GROUP,
+                grantee_id__in=user.groups.values('id'))
+        query |= Q(grantee_type=PermissionModel.GRANTEE_TEAM,
+                grantee_id__in=user.team_ids)
+        return self.filter(query)
+
+    def granting(self, perm):
+        """
+        Filter permissions whose bit for the given permission is set.
+        """
+        bit = perm_bit(perm)
+        return self.annotate(granted_bit=F('perms').bitand(bit)) \
+            .filter(granted_bit=bit)
+
+
 @python_2_unicode_compatible
 class PermissionModel(models.Model):
 
     class Meta:
         abstract = True
 
+    objects = PermissionQuerySet.as_manager()
+
     GRANTEE_USER = 0
     GRANTEE_GROUP = 1
     GRANTEE_TEAM = 2
@@ -40,26 +170,50 @@ class PermissionModel(models.Model):
             default=GRANTEE_USER, verbose_name="Grantee type")
     grantee_id = models.IntegerField()
 
+    perms = models.IntegerField(default=0, verbose_name="Permissions")
+
+    @classmethod
+    def permission_fields(cls):
+        if '_permission_fields' not in cls.__dict__:
+            fields = {}
+            for klass in reversed(cls.__mro__):
+                for name, attr in vars(klass).items():
+                    if isinstance(attr, PermissionBit):
+                        fields[name] = attr
+            cls._permission_fields = sorted(fields.values(),
+                    key=lambda field: field.creation_counter)
+        return cls._permission_fields
+
     def get_grantee(self):
+        grantee = getattr(self, '_grantee', None)
+        if grantee is not None and grantee.id == self.grantee_id \
+                and self.grantee_type == self.get_grantee_type_of(grantee):
+            return grantee
         if self.grantee_type == self.GRANTEE_USER:
             Model = User
         elif self.grantee_type == self.GRANTEE_GROUP:
             Model = Group
         else:
             Model = Team
-        return Model.objects.get(id=self.grantee_id)
+        self._grantee = Model.objects.get(id=self.grantee_id)
+        return self._grantee
 
-    def set_grantee(self, grantee):
+    @classmethod
+    def get_grantee_type_of(cls, grantee):
         if isinstance(grantee, User):
-            self.grantee_type = self.GRANTEE_USER
+            return cls.GRANTEE_USER
         elif isinstance(grantee, Group):
-            self.grantee_type = self.GRANTEE_GROUP
+            return cls.GRANTEE_GROUP
         elif isinstance(grantee, Team):
-            self.grantee_type = self.GRANTEE_TEAM
+            return cls.GRANTEE_TEAM
         else:
             raise ValueError('Grantee object must be '
                     'an User, a Group or a Team instance.')
+
+    def set_grantee(self, grantee):
+        self.grantee_type = self.get_grantee_type_of(grantee)
         self.grantee_id = grantee.id
+        self._grantee = grantee
 
     grantee = property(get_grantee, set_grantee)
 
@@ -71,23 +225,19 @@ class PermissionModel(models.Model):
         elif self.grantee_type == self.GRANTEE_GROUP:
             return user.groups.filter(id=self.grantee_id).exists()
         elif self.grantee_type == self.GRANTEE_TEAM:
-            return Team.objects.filter(id=self.grantee_id) \
-                .filter(Q(groups__in=user.groups.all()) | Q(users=user)) \
-                .exists()
+            return self.grantee_id in user.team_ids
         else:
             return False
 
     @property
     def all_perms(self):
-        for field in self._meta.fields:
-            if isinstance(field, PermissionField):
-                yield field.name
+        for field in self.permission_fields():
+            yield field.name
 
     @property
     def all_perms_fields_values(self):
-        for field in self._meta.fields:
-            if isinstance(field, PermissionField):
-                yield (field, getattr(self, field.name))
+        for field in self.permission_fields():
+            yield (field, getattr(self, field.name))
 
     @property
     def type(self):
@@ -109,62 +259,53 @@ class GlobalPermission(PermissionModel):
 
     @property
     def global_perms_fields_values(self):
-        for field in self._meta.fields:
-            if isinstance(field, GlobalPermissionField):
+        for field in self.permission_fields():
+            if isinstance(field, GlobalPermissionBit):
                 yield (field, getattr(self, field.name))
 
     @property
     def project_perms_fields_values(self):
-        for field in self._meta.fields:
-            if isinstance(field, ProjectPermissionField):
+        for field in self.permission_fields():
+            if isinstance(field, ProjectPermissionBit):
                 yield (field, getattr(self, field.name))
 
+    perms = models.IntegerField(default=perms_mask('create_project'),
+            verbose_name="Permissions")
+
     # Global permissions
 
-    create_project = GlobalPermissionField(default=True,
-            verbose_name='Create project')
-    modify_project = GlobalPermissionField(default=False,
-            verbose_name='Modify project')
-    delete_project = GlobalPermissionField(default=False,
-            verbose_name='Delete project')
+    create_project = GlobalPermissionBit(verbose_name='Create project')
+    modify_project = GlobalPermissionBit(verbose_name='Modify project')
+    delete_project = GlobalPermissionBit(verbose_name='Delete project')
 
-    manage_settings = GlobalPermissionField(default=False,
-            verbose_name='Manage settings')
-    manage_accounts = GlobalPermissionField(default=False,
-            verbose_name='Manage users, groups and teams')
-    manage_global_permission = GlobalPermissionField(default=False,
-            verbose_name='Manage global permissions')
+    manage_settings = GlobalPermissionBit(verbose_name='Manage settings')
+    manage_accounts = GlobalPermissionBit(
+        verbose_name='Manage users, groups and teams')
+    manage_global_permission = GlobalPermissionBit(
+        verbose_name='Manage global permissions')
 
     # Project permissions, given on ALL projects
 
-    access_project = ProjectPermissionField(default=False,
-            verbose_name='Access all project')
-
-    create_issue = ProjectPermissionField(default=False,
-            verbose_name='Create issue')
-    modify_issue = ProjectPermissionField(default=False,
-            verbose_name='Modify issue')
-    manage_issue = ProjectPermissionField(default=False,
-            verbose_name='Manage issue')
-    delete_issue = ProjectPermissionField(default=False,
-            verbose_name='Delete issue')
-
-    create_comment = ProjectPermissionField(default=False,
-            verbose_name='Create comment')
-    modify_comment = ProjectPermissionField(default=False,
-            verbose_name='Modify comment')
-    modify_own_comment = ProjectPermissionField(default=False,
-            verbose_name='Modify his issue and comment')
-    delete_comment = ProjectPermissionField(default=False,
-            verbose_name='Delete comment')
-
-    manage_tags = ProjectPermissionField(default=False,
-            verbose_name='Assign and remove labels and milestones')
-    delete_tags = ProjectPermissionField(default=False,
-            verbose_name='Delete labels and milestones')
-
-    manage_project_permission = ProjectPermissionField(default=False,
-            verbose_name='Manage project permissions')
+    access_project = ProjectPermissionBit(verbose_name='Access all project')
+
+    create_issue = ProjectPermissionBit(verbose_name='Create issue')
+    modify_issue = ProjectPermissionBit(verbose_name='Modify issue')
+    manage_issue = ProjectPermissionBit(verbose_name='Manage issue')
+    delete_issue = ProjectPermissionBit(verbose_name='Delete issue')
+
+    create_comment = ProjectPermissionBit(verbose_name='Create comment')
+    modify_comment = ProjectPermissionBit(verbose_name='Modify comment')
+    modify_own_comment = ProjectPermissionBit(
+        verbose_name='Modify his issue and comment')
+    delete_comment = ProjectPermissionBit(verbose_name='Delete comment')
+
+    manage_tags = ProjectPermissionBit(
+        verbose_name='Assign and remove labels and milestones')
+    delete_tags = ProjectPermissionBit(
+        verbose_name='Delete labels and milestones')
+
+    manage_project_permission = ProjectPermissionBit(
+        verbose_name='Manage project permissions')
 
     def __str__(self):
         return self.grantee.__str__() + "'s global permissions"
@@ -179,31 +320,23 @@ class ProjectPermission(PermissionModel):
     project = models.ForeignKey(Project, related_name='permissions',
             on_delete=models.CASCADE)
 
-    create_issue = PermissionField(default=False,
-            verbose_name='Create issue')
-    modify_issue = PermissionField(default=False,
-            verbose_name='Modify issue')
-    manage_issue = PermissionField(default=False,
-            verbose_name='Manage issue')
-    delete_issue = PermissionField(default=False,
-            verbose_name='Delete issue')
-
-    create_comment = PermissionField(default=False,
-            verbose_name='Create comment')
-    modify_comment = PermissionField(default=False,
-            verbose_name='Modify comment')
-    modify_own_comment = PermissionField(default=False,
-            verbose_name='Modify his issue and comment')
-    delete_comment = PermissionField(default=False,
-            verbose_name='Delete comment')
-
-    manage_tags = PermissionField(default=False,
-            verbose_name='Assign and remove labels and milestones')
-    delete_tags = PermissionField(default=False,
-            verbose_name='Delete labels and milestones')
-
-    manage_project_permission = PermissionField(default=False,
-            verbose_name='Manage project permissions')
+    create_issue = PermissionBit(verbose_name='Create issue')
+    modify_issue = PermissionBit(verbose_name='Modify issue')
+    manage_issue = PermissionBit(verbose_name='Manage issue')
+    delete_issue = PermissionBit(verbose_name='Delete issue')
+
+    create_comment = PermissionBit(verbose_name='Create comment')
+    modify_comment = PermissionBit(verbose_name='Modify comment')
+    modify_own_comment = PermissionBit(
+        verbose_name='Modify his issue and comment')
+    delete_comment = PermissionBit(verbose_name='Delete comment')
+
+    manage_tags = PermissionBit(
+        verbose_name='Assign and remove labels and milestones')
+    delete_tags = PermissionBit(verbose_name='Delete labels and milestones')
+
+    manage_project_permission = PermissionBit(
+        verbose_name='Manage project permissions')
 
     def __str__(self):
         return self.grantee.__str__() + "'s permissions on " \
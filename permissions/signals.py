@@ -1,8 +1,11 @@
-from django.db.models.signals import pre_delete
+from django.db.models.signals import pre_delete, post_save, post_delete
+from django.db.models.signals import m2m_changed
 from django.dispatch import receiver
 
 from accounts.models import *
 from permissions.models import *
+from permissions.cache import invalidate_perms
+from tracker.models import Project
 
 
 """
@@ -46,3 +49,55 @@ def clean_team_perms(sender, instance, **kwargs):
     perms = ProjectPermission.objects.filter(grantee_id=instance.id,
             grantee_type=GlobalPermission.GRANTEE_TEAM)
     perms.delete()
+
+
+"""
+Permissions bitsets and accessible projects are cached, they must be
+recomputed each time a permission, the way it reaches an user, or a project
+access level is modified.
+"""
+
+
+@receiver(post_save, sender=GlobalPermission,
+        dispatch_uid="invalidate_global_perms_save")
+@receiver(post_delete, sender=GlobalPermission,
+        dispatch_uid="invalidate_global_perms_delete")
+@receiver(post_save, sender=ProjectPermission,
+        dispatch_uid="invalidate_project_perms_save")
+@receiver(post_delete, sender=ProjectPermission,
+        dispatch_uid="invalidate_project_perms_delete")
+def invalidate_perms_on_change(sender, **kwargs):
+    invalidate_perms()
+
+
+@receiver(m2m_changed, sender=Team.users.through,
+        dispatch_uid="invalidate_perms_team_users")
+@receiver(m2m_changed, sender=Team.groups.through,
+        dispatch_uid="invalidate_perms_team_groups")
+@receiver(m2m_changed, sender=User.groups.through,
+        dispatch_uid="invalidate_perms_user_groups")
+def invalidate_perms_on_membership(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_perms()
+
+
+@receiver(post_save, sender=User, dispatch_uid="invalidate_perms_user_save")
+def invalidate_perms_on_user_save(sender, update_fields, **kwargs):
+    # do not invalidate everything on each login
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    invalidate_perms()
+
+
+@receiver(post_delete, sender=User,
+        dispatch_uid="invalidate_perms_user_delete")
+@receiver(post_delete, sender=Group,
+        dispatch_uid="invalidate_perms_group_delete")
+@receiver(post_delete, sender=Team,
+        dispatch_uid="invalidate_perms_team_delete")
+@receiver(post_save, sender=Project,
+        dispatch_uid="invalidate_perms_project_save")
+@receiver(post_delete, sender=Project,
+        dispatch_uid="invalidate_perms_project_delete")
+def invalidate_perms_on_object_change(sender, **kwargs):
+    invalidate_perms()
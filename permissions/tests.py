@@ -1,18 +1,41 @@
 from django.test import TestCase
+from unittest import skipIf
 from django.urls import reverse
 from django.contrib.auth.models import AnonymousUser
 
 from permissions.models import *
 from permissions.models import PermissionModel as PermModel
+from permissions.models import perms_mask, load_grantees
 from accounts.models import *
 from tracker.models import *
+from tracker.utils import granted_project_ids
+from permissions.backends import users_with_perm, users_with_access
+from permissions.backends import get_users_with_access
+from permissions.matrix import PermissionMatrix, np
+from permissions import matrix as perms_matrix
+from permissions.context_processors import PermWrapper
+from permissions import cache as perms_cache
 
 
-class TestViews(TestCase):
+class CacheTestCase(TestCase):
+
+    """
+    Cached permissions outlive the rollback of the changes made by each test:
+    tests start from an empty cache.
+    """
+
+    def setUp(self):
+        super(CacheTestCase, self).setUp()
+        perms_cache.get_cache().clear()
+        perms_cache.invalidate_perms()
+
+
+class TestViews(CacheTestCase):
 
     fixtures = ['test_permissions_views']
 
     def setUp(self):
+        super(TestViews, self).setUp()
         self.client.login(username='admin', password='admin')
 
     def test_global_perm_list(self):
@@ -21,6 +44,27 @@ class TestViews(TestCase):
         self.assertContains(response, "Create project")
         self.assertContains(response, "Access all project")
 
+    @skipIf(np is None, "NumPy is not installed")
+    def test_global_perm_export(self):
+        response = self.client.get(reverse('export-global-permission'))
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith('user,project,create_project,'))
+        response = self.client.get(reverse('export-global-permission'),
+                {'format': 'npz'})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('export-global-permission'),
+                {'format': 'xml'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_global_perm_export_without_numpy(self):
+        self.addCleanup(setattr, perms_matrix, 'np', perms_matrix.np)
+        perms_matrix.np = None
+        response = self.client.get(reverse('export-global-permission'),
+                follow=True)
+        self.assertRedirects(response, reverse('list-global-permission'))
+        self.assertContains(response, 'NumPy is required')
+
     def test_global_perm_add(self):
         count = GlobalPermission.objects.count()
         response = self.client.get(reverse('add-global-permission'))
@@ -350,7 +394,8 @@ class TestViews(TestCase):
         perm = ProjectPermission.objects.get(pk=perm.pk)
         self.assertEqual(perm.create_issue, True)
 
-class TestGlobalPerm(TestCase):
+
+class TestGlobalPerm(CacheTestCase):
 
     fixtures = ['test_permissions']
 
@@ -467,7 +512,7 @@ class TestGlobalPerm(TestCase):
         self.assertFalse(guess.has_perm('create_project'))
 
 
-class TestProjectPerm(TestCase):
+class TestProjectPerm(CacheTestCase):
 
     fixtures = ['test_permissions']
 
@@ -609,7 +654,7 @@ class TestProjectPerm(TestCase):
         self.assertFalse(guess.has_perm('create_issue', project1))
 
 
-class TestModels(TestCase):
+class TestModels(CacheTestCase):
 
     fixtures = ['test_permissions']
 
@@ -693,3 +738,243 @@ class TestModels(TestCase):
                 grantee_id=team.id)
         self.assertTrue(perm.granted_to(user))
         self.assertFalse(perm.granted_to(guess))
+        # the teams of the user are resolved once
+        with self.assertNumQueries(0):
+            self.assertTrue(perm.granted_to(user))
+
+
+class TestBackend(CacheTestCase):
+
+    fixtures = ['test_permissions']
+
+    def test_memoized(self):
+        project = Project.objects.get(name='project-1')
+        user = User.objects.get(username='user')
+        group = Group.objects.get(name='group')
+        team = Team.objects.get(name='team')
+        user.groups.add(group)
+        team.groups.add(group)
+        GlobalPermission.objects.create(
+            grantee_type=PermModel.GRANTEE_GROUP,
+            grantee_id=group.id,
+            create_project=True)
+        ProjectPermission.objects.create(
+            project=project,
+            grantee_type=PermModel.GRANTEE_TEAM,
+            grantee_id=team.id,
+            create_issue=True)
+        self.assertTrue(user.has_perm('create_project'))
+        self.assertTrue(user.has_perm('create_issue', project))
+        with self.assertNumQueries(0):
+            for i in range(10):
+                self.assertTrue(user.has_perm('create_project'))
+                self.assertTrue(user.has_perm('create_project', project))
+                self.assertTrue(user.has_perm('create_issue', project))
+                self.assertFalse(user.has_perm('create_issue'))
+                self.assertFalse(user.has_perm('delete_issue', project))
+                self.assertFalse(user.has_perm('not_existing', project))
+        team.groups.remove(group)
+        self.assertFalse(user.has_perm('create_issue', project))
+        self.assertTrue(user.has_perm('create_project', project))
+
+    def test_bitmask(self):
+        project = Project.objects.get(name='project-1')
+        perm = ProjectPermission(project=project,
+                grantee_type=PermModel.GRANTEE_USER, grantee_id=1,
+                create_issue=True, delete_issue=True)
+        self.assertEqual(perm.perms,
+                perms_mask('create_issue', 'delete_issue'))
+        perm.delete_issue = False
+        perm.manage_tags = True
+        perm.save()
+        perm = ProjectPermission.objects.get(pk=perm.pk)
+        self.assertTrue(perm.create_issue)
+        self.assertFalse(perm.delete_issue)
+        self.assertTrue(perm.manage_tags)
+        self.assertTrue(ProjectPermission.objects.granting('manage_tags')
+                .filter(pk=perm.pk).exists())
+        self.assertFalse(ProjectPermission.objects.granting('delete_issue')
+                .filter(pk=perm.pk).exists())
+
+    def test_shared_cache(self):
+        project = Project.objects.get(name='project-1')
+        user = User.objects.get(username='user')
+        ProjectPermission.objects.create(
+            project=project,
+            grantee_type=PermModel.GRANTEE_USER,
+            grantee_id=user.id,
+            create_issue=True)
+        self.assertTrue(user.has_perm('create_issue', project))
+        # a new user object, as in another request or process
+        user = User.objects.get(username='user')
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm('create_issue', project))
+        ProjectPermission.objects.filter(project=project).delete()
+        user = User.objects.get(username='user')
+        self.assertFalse(user.has_perm('create_issue', project))
+
+    def test_granted_projects(self):
+        project1 = Project.objects.get(name='project-1')
+        project2 = Project.objects.get(name='project-2')
+        user = User.objects.get(username='user')
+        team = Team.objects.get(name='team')
+        self.assertEqual(granted_project_ids(AnonymousUser()), set())
+        user.team_ids  # cached apart from the projects
+        with self.assertNumQueries(1):
+            self.assertEqual(granted_project_ids(user), set())
+        with self.assertNumQueries(0):
+            self.assertEqual(granted_project_ids(user), set())
+        team.users.add(user)
+        ProjectPermission.objects.create(
+            project=project1,
+            grantee_type=PermModel.GRANTEE_TEAM,
+            grantee_id=team.id)
+        self.assertEqual(granted_project_ids(user), {project1.id})
+        GlobalPermission.objects.create(
+            grantee_type=PermModel.GRANTEE_USER,
+            grantee_id=user.id,
+            access_project=True)
+        self.assertEqual(granted_project_ids(user),
+                {project1.id, project2.id})
+        admin = User.objects.get(username='admin')
+        self.assertEqual(granted_project_ids(admin),
+                {project1.id, project2.id})
+
+    def test_users_with_perm(self):
+        project = Project.objects.get(name='project-1')
+        admin = User.objects.get(username='admin')
+        user = User.objects.get(username='user')
+        guess = User.objects.get(username='guess')
+        group = Group.objects.get(name='group')
+        team = Team.objects.get(name='team')
+        self.assertEqual(users_with_perm('create_issue', project), {admin.id})
+        self.assertEqual(users_with_access(project), {admin.id})
+        guess.groups.add(group)
+        team.groups.add(group)
+        team.users.add(user)
+        ProjectPermission.objects.create(
+            project=project,
+            grantee_type=PermModel.GRANTEE_TEAM,
+            grantee_id=team.id,
+            create_issue=True)
+        with self.assertNumQueries(3):
+            self.assertEqual(users_with_perm('create_issue', project),
+                    {admin.id, user.id, guess.id})
+        self.assertEqual(users_with_perm('create_issue'), {admin.id})
+        self.assertEqual(users_with_perm('delete_issue', project), {admin.id})
+        with self.assertNumQueries(3):
+            self.assertEqual(users_with_access(project),
+                    {admin.id, user.id, guess.id})
+        # the users are only fetched when the queryset is used
+        with self.assertNumQueries(2):
+            users = get_users_with_access(project)
+        self.assertEqual(set(User.objects.filter(id__in=users.values('id'))),
+                {admin, user, guess})
+        project2 = Project.objects.get(name='project-2')
+        self.assertEqual(users_with_access(project2), {admin.id})
+        GlobalPermission.objects.create(
+            grantee_type=PermModel.GRANTEE_USER,
+            grantee_id=user.id,
+            access_project=True)
+        self.assertEqual(users_with_access(project2), {admin.id, user.id})
+
+    @skipIf(np is None, "NumPy is not installed")
+    def test_matrix(self):
+        project = Project.objects.get(name='project-1')
+        user = User.objects.get(username='user')
+        guess = User.objects.get(username='guess')
+        group = Group.objects.get(name='group')
+        team = Team.objects.get(name='team')
+        guess.groups.add(group)
+        team.groups.add(group)
+        team.users.add(user)
+        GlobalPermission.objects.create(
+            grantee_type=PermModel.GRANTEE_GROUP,
+            grantee_id=group.id,
+            create_project=True)
+        ProjectPermission.objects.create(
+            project=project,
+            grantee_type=PermModel.GRANTEE_TEAM,
+            grantee_id=team.id,
+            create_issue=True,
+            manage_tags=True)
+        ProjectPermission.objects.create(
+            project=project,
+            grantee_type=PermModel.GRANTEE_USER,
+            grantee_id=user.id,
+            delete_issue=True)
+        matrix = PermissionMatrix()
+        for i, username in enumerate(matrix.users):
+            user = User.objects.get(username=username)
+            for j, name in enumerate(matrix.projects):
+                project = Project.objects.get(name=name)
+                for k, perm in enumerate(matrix.permissions):
+                    self.assertEqual(matrix.matrix[i, j, k],
+                            user.has_perm(perm, project))
+        self.assertTrue(matrix.matrix[matrix.users.index('user'),
+                matrix.projects.index('project-1'),
+                matrix.permissions.index('delete_issue')])
+        lines = ''.join(matrix.iter_csv()).splitlines()
+        self.assertEqual(len(lines),
+                1 + len(matrix.users) * len(matrix.projects))
+        # same result when computed by chunks of rows
+        self.addCleanup(setattr, perms_matrix, 'CHUNK_SIZE',
+                perms_matrix.CHUNK_SIZE)
+        perms_matrix.CHUNK_SIZE = 2
+        self.assertTrue((PermissionMatrix().matrix == matrix.matrix).all())
+
+    def test_perm_wrapper(self):
+        project = Project.objects.get(name='project-1')
+        user = User.objects.get(username='user')
+        ProjectPermission.objects.create(
+            project=project,
+            grantee_type=PermModel.GRANTEE_USER,
+            grantee_id=user.id,
+            create_issue=True)
+        wrapper = PermWrapper(user, project)
+        for i in range(10):
+            self.assertTrue(wrapper['create_issue'])
+            self.assertFalse(wrapper['delete_issue'])
+            self.assertFalse('manage_tags' in wrapper)
+        # the bits, then once for each permission not granted
+        self.assertEqual(wrapper.hits, 3)
+        self.assertFalse(wrapper['tracker.add_issue'])
+        self.assertFalse(wrapper['tracker.add_issue'])
+        self.assertEqual(wrapper.hits, 4)
+        admin = User.objects.get(username='admin')
+        wrapper = PermWrapper(admin, project)
+        self.assertTrue(wrapper['delete_issue'])
+        self.assertTrue(wrapper['tracker.add_issue'])
+        # only the configured backends are asked
+        with self.settings(AUTHENTICATION_BACKENDS=[
+                'django.contrib.auth.backends.ModelBackend']):
+            wrapper = PermWrapper(user, project)
+            self.assertFalse(wrapper['create_issue'])
+
+    def test_load_grantees(self):
+        project = Project.objects.get(name='project-1')
+        for user in User.objects.all():
+            ProjectPermission.objects.create(project=project,
+                    grantee_type=PermModel.GRANTEE_USER, grantee_id=user.id)
+        ProjectPermission.objects.create(project=project,
+                grantee_type=PermModel.GRANTEE_GROUP,
+                grantee_id=Group.objects.get(name='group').id)
+        ProjectPermission.objects.create(project=project,
+                grantee_type=PermModel.GRANTEE_TEAM,
+                grantee_id=Team.objects.get(name='team').id)
+        perms = ProjectPermission.objects.filter(project=project)
+        with self.assertNumQueries(4):
+            loaded = list(perms)
+            load_grantees(loaded)
+            names = [perm.name for perm in loaded]
+        self.assertEqual(names, [perm.name for perm in perms])
+        self.assertIn('team', names)
+        perm = perms.select_related('project').get(
+            grantee_type=PermModel.GRANTEE_GROUP)
+        load_grantees([perm])
+        with self.assertNumQueries(0):
+            self.assertEqual(str(perm),
+                    "group's permissions on project-1 project")
+        perm.grantee = Team.objects.get(name='team')
+        with self.assertNumQueries(0):
+            self.assertEqual(perm.name, 'team')
@@ -6,6 +6,7 @@ from permissions import views
 urlpatterns = [
     # Global permissions
     url(r'^admin/permissions/$', views.global_perm_list, name='list-global-permission'),
+    url(r'^admin/permissions/export/$', views.global_perm_export, name='export-global-permission'),
     url(r'^admin/permissions/add/$', views.global_perm_edit, name='add-global-permission'),
     url(r'^admin/permissions/(?P<id>[0-9]+)/edit/$', views.global_perm_edit, name='edit-global-permission'),
     url(r'^admin/permissions/(?P<id>[0-9]+)/delete/$', views.global_perm_delete, name='delete-global-permission'),
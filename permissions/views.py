@@ -1,19 +1,25 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.http import require_http_methods
 from django.contrib import messages
-from django.http import Http404, HttpResponse
-from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.core.exceptions import PermissionDenied, ImproperlyConfigured
+
+import io
 
 
 from permissions.models import *
+from permissions.models import load_grantees
 from permissions.forms import *
 from permissions.decorators import project_perm_required
+from permissions.matrix import PermissionMatrix
 
 
 @project_perm_required('manage_global_permission')
 def global_perm_list(request):
+    permissions = list(GlobalPermission.objects.all())
+    load_grantees(permissions)
     return render(request, 'permissions/global_perm_list.html', {
-        'permissions': GlobalPermission.objects.all(),
+        'permissions': permissions,
     })
 
 
@@ -67,11 +73,36 @@ def global_perm_toggle(request, id, perm):
     return HttpResponse('1' if state else '0')
 
 
+@project_perm_required('manage_global_permission')
+def global_perm_export(request):
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in ['csv', 'npz']:
+        raise Http404
+    try:
+        matrix = PermissionMatrix()
+    except ImproperlyConfigured as e:
+        messages.error(request, str(e))
+        return redirect('list-global-permission')
+    if fmt == 'npz':
+        f = io.BytesIO()
+        matrix.save_npz(f)
+        response = HttpResponse(f.getvalue(),
+                content_type='application/octet-stream')
+    else:
+        response = StreamingHttpResponse(matrix.iter_csv(),
+                content_type='text/csv')
+    filename = 'permissions.%s' % fmt
+    response['Content-Disposition'] = 'attachment; filename="%s"' % filename
+    return response
+
+
 @project_perm_required('manage_project_permission')
 def project_perm_list(request, project):
+    permissions = list(ProjectPermission.objects.filter(project=project))
+    load_grantees(permissions)
     return render(request, 'permissions/project_perm_list.html', {
         'project': project,
-        'permissions': ProjectPermission.objects.filter(project=project).all(),
+        'permissions': permissions,
     })
 
 
@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+import time
+
+
+__all__ = ['Versions', 'get_cache', 'get_version', 'invalidate']
+
+
+"""
+Data derived from the content of the projects (compiled issue filters, ...)
+is shared between processes through Django's cache framework (the cache
+alias is given by the TRACKER_CACHE setting).
+
+Cached entries are keyed by the versions of what they depend on, stored in
+the cache itself: each kind of data has a version per project, plus a global
+one for objects shared between projects such as users. Bumping a version
+invalidates the entries depending on it, outdated ones being left to expire.
+"""
+
+
+class Versions(object):
+
+    """
+    Versions stored in the cache whose alias is given by the setting, under
+    keys starting with the prefix. Resolved permissions are versioned the
+    same way, see permissions.cache.
+
+    The local version is bumped along with the shared ones, so that objects
+    memoizing data for the duration of a request see the changes made by the
+    current process immediately.
+    """
+
+    def __init__(self, prefix, setting):
+        self.prefix = prefix
+        self.setting = setting
+        self.local = 0
+
+    def get_cache(self):
+        return caches[getattr(settings, self.setting, 'default')]
+
+    def get_key(self, *names):
+        return ':'.join([self.prefix, 'version'] + [str(n) for n in names])
+
+    def get(self, key):
+        cache = self.get_cache()
+        version = cache.get(key)
+        if version is None:
+            # Start from the current time rather than from 0 so that a version
+            # lost by eviction or restart of the cache is never reused.
+            cache.add(key, int(time.time() * 1000), None)
+            version = cache.get(key)
+        return version
+
+    def bump(self, key):
+        cache = self.get_cache()
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, int(time.time() * 1000), None)
+
+    def invalidate(self, key):
+        self.local += 1
+        self.bump(key)
+        # Bump again on commit as other processes may have cached data read
+        # from the database before the changes were committed.
+        transaction.on_commit(lambda: self.bump(key))
+
+
+versions = Versions('tracker', 'TRACKER_CACHE')
+
+
+def get_cache():
+    return versions.get_cache()
+
+
+def get_version_key(name, project_id=None):
+    if project_id is None:
+        return versions.get_key(name)
+    else:
+        return versions.get_key(name, project_id)
+
+
+def get_version(name, project_id=None):
+    return versions.get(get_version_key(name, project_id))
+
+
+def invalidate(name, project_id=None):
+    """
+    Invalidate the named data of the project, or of all projects if
+    project_id is None.
+    """
+    versions.invalidate(get_version_key(name, project_id))
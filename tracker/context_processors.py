@@ -1,4 +1,5 @@
-from tracker.models import Project
+from tracker.models import Project, ProjectUnreadCounter
+from tracker.utils import granted_project_ids
 
 
 def projects(request):
@@ -10,4 +11,9 @@ def projects(request):
     if hasattr(request, 'projects'):
         c['projects'] = request.projects
 
+    # callable so that it is only computed if displayed
+    c['unread_total'] = lambda: ProjectUnreadCounter.get_total(
+        Project.objects.filter(id__in=granted_project_ids(request.user),
+                               archived=False), request.user)
+
     return c
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q, Count
+
+from tracker.models import Project, Issue, ReadState, ProjectReadState
+from tracker.models import ProjectUnreadCounter
+from accounts.models import User
+
+
+# Counters saved at once.
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the unread counters from the events and read states'
+
+    def add_arguments(self, parser):
+        parser.add_argument('projects', nargs='*', metavar='project',
+                help='URL names of the projects (default: all projects)')
+
+    def handle(self, *args, **options):
+        projects = Project.objects.all()
+        if options['projects']:
+            projects = projects.filter(name__in=options['projects'])
+            missing = set(options['projects']) \
+                - set(projects.values_list('name', flat=True))
+            if missing:
+                raise CommandError("Unknown projects: %s"
+                        % ', '.join(sorted(missing)))
+        query = Q(readstates__issue__project__in=projects)
+        query |= Q(projectreadstates__project__in=projects)
+        readers = User.objects.filter(query).distinct()
+        users = 0
+        counters = []
+        with transaction.atomic():
+            ProjectUnreadCounter.objects.filter(project__in=projects) \
+                .delete()
+            for user in readers.iterator():
+                counters += self.get_counters(user, projects)
+                if len(counters) >= BATCH_SIZE:
+                    ProjectUnreadCounter.objects.bulk_create(counters)
+                    counters = []
+                users += 1
+            ProjectUnreadCounter.objects.bulk_create(counters)
+        if options['verbosity'] > 1:
+            self.stdout.write("Counters of %d users rebuilt." % users)
+
+    def get_counters(self, user, projects):
+        """
+        Return the counters of the user for the projects they read.
+        """
+        read = set(ReadState.objects
+                .filter(user=user, issue__project__in=projects)
+                .values_list('issue__project', flat=True)) \
+            | set(ProjectReadState.objects
+                .filter(user=user, project__in=projects)
+                .values_list('project', flat=True))
+        issues = ReadState.annotate_lastread(
+            Issue.objects.filter(project__in=read), user)
+        unread = dict(issues.filter(ReadState.unread('last_activity'))
+                .order_by().values_list('project')
+                .annotate(count=Count('pk')))
+        return [ProjectUnreadCounter(project_id=project, user=user,
+                issues=unread.get(project, 0)) for project in read]
@@ -2,8 +2,10 @@ from django.core.exceptions import ImproperlyConfigured
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.exceptions import PermissionDenied
 from django.contrib.auth.decorators import login_required
+from django.utils.functional import SimpleLazyObject
 
-from tracker.utils import granted_projects
+from tracker.models import Project
+from tracker.utils import granted_projects, granted_project_ids
 
 
 # This middleware protect only views of the following modules
@@ -32,15 +34,11 @@ class ProjectMiddleware(object):
                 " 'django.contrib.auth.middleware.AuthenticationMiddleware'"
                 " before the ProjectMiddleware class.")
 
-        all_projects = granted_projects(request.user)
-
-        # filtering archived / not archived projects
-        if 'archived' in view_kwargs:
-            request.archived = view_kwargs['archived']
-            request.projects = all_projects.filter(archived=request.archived)
-        else:
-            request.archived = False
-            request.projects = all_projects.filter(archived=request.archived)
+        # filtering archived / not archived projects, lazily as most views
+        # and templates never look at the list of projects
+        request.archived = view_kwargs.get('archived', False)
+        request.projects = SimpleLazyObject(lambda: granted_projects(
+            request.user).filter(archived=request.archived))
 
         # project
         if view.__module__ not in modules:
@@ -48,8 +46,10 @@ class ProjectMiddleware(object):
         project = view_kwargs.get('project')
         if not project:
             return
+        # the project must be resolved before the view to deny access
         try:
-            project = all_projects.get(name=project)
+            project = Project.objects.get(name=project,
+                    id__in=granted_project_ids(request.user))
         except ObjectDoesNotExist:
             if request.user.is_authenticated:
                 raise PermissionDenied()
@@ -58,5 +58,3 @@ class ProjectMiddleware(object):
         view_kwargs['project'] = project
         request.project = project
         request.archived = project.archived
-        request.projects = all_projects.filter(archived=request.archived)
-
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 05:07
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.utils.timezone
+
+
+def backfill_last_activity(apps, schema_editor):
+    Issue = apps.get_model('tracker', 'Issue')
+    Event = apps.get_model('tracker', 'Event')
+    last_event = Event.objects.filter(issue=OuterRef('pk')) \
+            .order_by('-date').values('date')[:1]
+    Issue.objects.update(last_activity=Coalesce(Subquery(last_event),
+            F('opened_at')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0010_auto_20171026_1010'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='issue',
+            name='last_activity',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.RunPython(backfill_last_activity,
+            migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(fields=['project', 'closed', 'last_activity'], name='tracker_iss_project_31bacc_idx'),
+        ),
+    ]
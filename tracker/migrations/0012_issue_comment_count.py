@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 05:08
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+COMMENT = 10 # Event.COMMENT
+
+
+def backfill_comment_count(apps, schema_editor):
+    Issue = apps.get_model('tracker', 'Issue')
+    Event = apps.get_model('tracker', 'Event')
+    comments = Event.objects.filter(issue=OuterRef('pk'), code=COMMENT) \
+            .order_by().values('issue').annotate(count=Count('pk'))
+    Issue.objects.update(comment_count=Coalesce(
+            Subquery(comments.values('count')), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0011_issue_last_activity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='issue',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_comment_count,
+            migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(fields=['project', 'closed', 'comment_count'], name='tracker_iss_project_7ab32f_idx'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 05:41
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+import json
+
+
+# Event codes
+ADD_LABEL = 4
+DEL_LABEL = 5
+SET_MILESTONE = 6
+CHANGE_MILESTONE = 7
+UNSET_MILESTONE = 8
+
+
+def move_args(apps, schema_editor):
+    Event = apps.get_model('tracker', 'Event')
+    Label = apps.get_model('tracker', 'Label')
+    labels = set(Label.objects.values_list('id', flat=True))
+    events = Event.objects.filter(code__in=[ADD_LABEL, DEL_LABEL,
+            SET_MILESTONE, CHANGE_MILESTONE, UNSET_MILESTONE])
+    for event in events.iterator():
+        args = json.loads(event._args)
+        label = args.pop('label', None)
+        if label in labels:
+            event.label_id = label
+        event.milestone_name = args.pop('milestone',
+                args.pop('new_milestone', ''))
+        event.old_milestone_name = args.pop('old_milestone', '')
+        event._args = json.dumps(args)
+        event.save(update_fields=['label', 'milestone_name',
+                'old_milestone_name', '_args'])
+
+
+def restore_args(apps, schema_editor):
+    Event = apps.get_model('tracker', 'Event')
+    events = Event.objects.filter(code__in=[ADD_LABEL, DEL_LABEL,
+            SET_MILESTONE, CHANGE_MILESTONE, UNSET_MILESTONE])
+    for event in events.iterator():
+        args = json.loads(event._args)
+        if event.code in (ADD_LABEL, DEL_LABEL):
+            args['label'] = event.label_id
+        elif event.code == CHANGE_MILESTONE:
+            args['old_milestone'] = event.old_milestone_name
+            args['new_milestone'] = event.milestone_name
+        else:
+            args['milestone'] = event.milestone_name
+        event._args = json.dumps(args)
+        event.save(update_fields=['_args'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0015_unread_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='label',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='tracker.Label'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='milestone_name',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='old_milestone_name',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.RunPython(move_args, restore_args),
+    ]
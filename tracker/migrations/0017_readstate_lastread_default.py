@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 05:54
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0016_event_typed_args'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='readstate',
+            name='lastread',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
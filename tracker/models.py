@@ -1,8 +1,12 @@
 from __future__ import unicode_literals
 
-from django.db import models
+from django.db import models, connection, transaction, IntegrityError
+from django.db.models import Q, F, Count, Sum, Max, Case, When, Value
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.core.validators import RegexValidator
 from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.safestring import mark_safe
 from django.utils.html import escape, format_html
 from django.utils.encoding import python_2_unicode_compatible
@@ -10,17 +14,22 @@ from django.contrib.sites.models import Site
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.urls import reverse
 from django.contrib.sites.shortcuts import get_current_site
-from django.core.exceptions import ObjectDoesNotExist
 
 from colorful.fields import RGBColorField
 
 import json
+import logging
+from collections import defaultdict
 from datetime import datetime, timedelta
 
 from accounts.models import User
 
 
-__all__ = ['Project', 'Issue', 'Label', 'Milestone', 'ReadState', 'Event']
+__all__ = ['Project', 'Issue', 'Label', 'Milestone', 'ReadState',
+           'ProjectReadState', 'ProjectUnreadCounter', 'Event']
+
+
+logger = logging.getLogger(__name__)
 
 
 class Settings(models.Model):
@@ -89,18 +98,68 @@ class Project(models.Model):
     def labels(self):
         return Label.objects.filter(project=self, deleted=False)
 
+    @cached_property
+    def issues_url(self):
+        return reverse('list-issue', kwargs={'project': self.name})
+
     @property
     def milestones(self):
         return Milestone.objects.filter(project=self, deleted=False)
 
     def get_unread_issues_nb(self, user):
+        return Project.get_issues_summary([self], user)[self.pk]['unread']
+
+    def mark_as_read(self, user):
+        """
+        Mark every issue of the project as read by the user, by moving the
+        date of the project read state, read states of the issues becoming
+        useless.
+        """
         if not user.is_authenticated:
-            return 0
-        count = 0
-        for issue in self.issues.all():
-            if issue.have_unread_message(user):
-                count +=1
-        return count
+            return
+        now = timezone.now()
+        if not ProjectReadState.objects.filter(project=self, user=user) \
+                .update(lastread=now):
+            ProjectReadState.objects.get_or_create(project=self, user=user,
+                    defaults={'lastread': now})
+        ReadState.objects.filter(issue__project=self, user=user,
+                lastread__lte=now).delete()
+        if not ProjectUnreadCounter.objects.filter(project=self, user=user) \
+                .update(issues=0):
+            ProjectUnreadCounter.objects.get_or_create(project=self,
+                    user=user, defaults={'issues': 0})
+
+    @staticmethod
+    def get_issues_summary(projects, user=None):
+        """
+        Return a dict giving the number of open, closed and unread issues of
+        each of the projects, by primary key, computed with a single query.
+
+        Unread issues are counted from the read states of the user, if any;
+        ProjectUnreadCounter gives the same numbers at a lower cost.
+        """
+        summary = dict((project.pk, {'open': 0, 'closed': 0, 'unread': 0})
+                for project in projects)
+        issues = Issue.objects.filter(project__in=summary.keys()).order_by()
+        if user is not None and user.is_authenticated:
+            issues = ReadState.annotate_lastread(issues, user)
+            unread = Count(Case(When(ReadState.unread('last_activity'),
+                    then=1), output_field=models.IntegerField()))
+        else:
+            unread = Value(0, output_field=models.IntegerField())
+        issues = issues.values('project') \
+            .annotate(open=Count(Case(When(closed=False, then=1),
+                    output_field=models.IntegerField()))) \
+            .annotate(closed=Count(Case(When(closed=True, then=1),
+                    output_field=models.IntegerField()))) \
+            .annotate(unread=unread)
+        for row in issues:
+            summary[row['project']] = {
+                'open': row['open'],
+                'closed': row['closed'],
+                'unread': row['unread'],
+            }
+        return summary
 
 
     def __str__(self):
@@ -125,7 +184,7 @@ class Label(models.Model):
     @property
     def url(self):
 
-        url = reverse('list-issue', kwargs={'project': self.project.name})
+        url = self.project.issues_url
         url += '?q=is:open%20label:' + self.quotted_name
 
         return mark_safe(url)
@@ -196,7 +255,7 @@ class Milestone(models.Model):
     @property
     def url(self):
 
-        url = reverse('list-issue', kwargs={'project': self.project.name})
+        url = self.project.issues_url
         url += '?q=is:open%20milestone:' + self.name
 
         return mark_safe(url)
@@ -216,6 +275,16 @@ class Issue(models.Model):
 
     class Meta:
         unique_together = ['project', 'id']
+        indexes = [
+            models.Index(fields=['project', 'closed', 'last_activity']),
+            models.Index(fields=['project', 'closed', 'comment_count']),
+            # filters, see tracker.utils.issue_manager
+            models.Index(fields=['project', 'last_activity']),
+            models.Index(fields=['project', 'opened_at']),
+            models.Index(fields=['project', 'due_date']),
+            models.Index(fields=['project', 'milestone']),
+            models.Index(fields=['project', 'assignee']),
+        ]
 
     title = models.CharField(max_length=128)
 
@@ -239,6 +308,27 @@ class Issue(models.Model):
     subscribers = models.ManyToManyField(User, blank=True,
             related_name='subscribed_issues')
 
+    # Date of the last event, or of the creation of the issue until its first
+    # event, maintained by tracker.signals.
+    last_activity = models.DateTimeField(default=timezone.now,
+            editable=False)
+
+    # Number of comment events, maintained by tracker.signals.
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Fields maintained by tracker.signals with UPDATE queries, that save()
+    # must never overwrite with the possibly outdated value of the instance.
+    denormalized_fields = ['last_activity', 'comment_count']
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('force_insert') \
+                and kwargs.get('update_fields') is None:
+            fields = [field.name for field in self._meta.concrete_fields
+                    if not field.primary_key]
+            kwargs['update_fields'] = [name for name in fields
+                    if name not in self.denormalized_fields]
+        super(Issue, self).save(*args, **kwargs)
+
     @staticmethod
     def next_id(project):
 
@@ -299,7 +389,7 @@ class Issue(models.Model):
         if commit:
             self.save()
         event = Event(issue=self, author=author,
-                code=Event.ADD_LABEL, args={'label': label.id})
+                code=Event.ADD_LABEL, label=label)
         event.save()
 
     def remove_label(self, author, label, commit=True):
@@ -307,7 +397,7 @@ class Issue(models.Model):
         if commit:
             self.save()
         event = Event(issue=self, author=author,
-                code=Event.DEL_LABEL, args={'label': label.id})
+                code=Event.DEL_LABEL, label=label)
         event.save()
 
     def add_milestone(self, author, milestone, commit=True):
@@ -316,13 +406,13 @@ class Issue(models.Model):
         if self.milestone:
             event = Event(issue=self, author=author,
                     code=Event.CHANGE_MILESTONE,
-                    args={'old_milestone': self.milestone.name,
-                          'new_milestone': milestone.name})
+                    old_milestone_name=self.milestone.name,
+                    milestone_name=milestone.name)
             event.save()
         else:
             event = Event(issue=self, author=author,
                     code=Event.SET_MILESTONE,
-                    args={'milestone': milestone.name})
+                    milestone_name=milestone.name)
             event.save()
         self.milestone = milestone
         if commit:
@@ -334,39 +424,72 @@ class Issue(models.Model):
             self.save()
         event = Event(issue=self, author=author,
                 code=Event.UNSET_MILESTONE,
-                args={'milestone': milestone.name})
+                milestone_name=milestone.name)
         event.save()
 
+    def get_lastread(self, user):
+        """
+        Return the date the user last read the issue, or the whole project,
+        or None if never.
+        """
+        project_dates = ProjectReadState.objects \
+            .filter(project_id=self.project_id, user=user) \
+            .values_list('lastread', flat=True)
+        dates = list(self.readstates.filter(user=user)
+                .values_list('lastread', flat=True)
+                .union(project_dates, all=True))
+        if dates:
+            return max(dates)
+        return None
+
     def have_unread_message(self, user):
         if not user.is_authenticated:
             return False
-        try:
-            readstate = self.readstates.get(user=user)
-        except ObjectDoesNotExist:
+        lastread = self.get_lastread(user)
+        if lastread is None:
             return True
-        return self.events.filter(date__gt=readstate.lastread).exists()
+        return self.events.filter(date__gt=lastread).exists()
 
     def get_unread_event_nb(self, user):
         if not user.is_authenticated:
             return 0
-        try:
-            readstate = self.readstates.get(user=user)
-        except ObjectDoesNotExist:
+        lastread = self.get_lastread(user)
+        if lastread is None:
             return self.events.count()
-        return self.events.filter(date__gt=readstate.lastread).count()
+        return self.events.filter(date__gt=lastread).count()
+
+    @staticmethod
+    def get_unread_events_nb(issues, user):
+        """
+        Return a dict giving the number of unread events of each of the
+        issues, by primary key, computed with a single query.
+        """
+        if not user.is_authenticated:
+            return {}
+        events = ReadState.annotate_lastread(
+            Event.objects.filter(issue__in=issues), user,
+            issue='issue', project='issue__project')
+        events = events.filter(ReadState.unread('date')).order_by() \
+            .values('issue').annotate(count=Count('pk'))
+        return dict((event['issue'], event['count']) for event in events)
 
     def mark_as_read(self, user):
+        """
+        Save the date the user read the issue, and return the date they
+        previously read it, or its opening date if never.
+
+        This costs two queries, unless the issue was unread (according to
+        its last activity as loaded): the unread counter of the user is
+        then updated too. ReadState.bulk_upsert saves batches of reads.
+        """
         if not user.is_authenticated:
             return timezone.now()
-        try:
-            readstate = self.readstates.get(user=user)
-            olddate = readstate.lastread
-        except ObjectDoesNotExist:
-            readstate = ReadState(issue=self, user=user)
-            olddate = self.opened_at
-        readstate.lastread = timezone.now()
-        readstate.save()
-        return olddate
+        olddate = self.get_lastread(user)
+        read = (self.pk, self.project_id, user.pk, timezone.now())
+        ReadState.save_reads([read])
+        if olddate is None or olddate < self.last_activity:
+            ProjectUnreadCounter.count_reads([read], [read[1:3]])
+        return olddate or self.opened_at
 
     def __str__(self):
         return self.title
@@ -378,7 +501,7 @@ class ReadState(models.Model):
 
     user = models.ForeignKey(User, related_name='%(class)ss', on_delete=models.CASCADE)
 
-    lastread = models.DateTimeField(auto_now_add=True)
+    lastread = models.DateTimeField(default=timezone.now)
 
     class Meta:
         unique_together = ('issue', 'user')
@@ -386,6 +509,343 @@ class ReadState(models.Model):
     def __str__(self):
         return "%s : User=%s lastread=%s" % (self.issue, self.user, self.lastread)
 
+    @staticmethod
+    def annotate_lastread(queryset, user, issue='pk', project='project'):
+        """
+        Annotate the objects of the queryset with the dates the user read
+        their issue (lastread) and their whole project (project_lastread).
+        issue and project give the path to them, e.g. 'issue' and
+        'issue__project' for events.
+        """
+        lastread = ReadState.objects.filter(issue=OuterRef(issue),
+                user=user).values('lastread')
+        project_lastread = ProjectReadState.objects \
+            .filter(project=OuterRef(project), user=user) \
+            .values('lastread')
+        return queryset.annotate(lastread=Subquery(lastread),
+                project_lastread=Subquery(project_lastread))
+
+    @staticmethod
+    def get_upsert_clause():
+        """
+        Return the clause turning an INSERT of read states into an upsert
+        keeping the most recent dates, or None if the database does not
+        support it (SQLite < 3.24, PostgreSQL < 9.5, other vendors).
+        """
+        qn = connection.ops.quote_name
+        names = {
+            'table': qn(ReadState._meta.db_table),
+            'issue': qn(ReadState._meta.get_field('issue').column),
+            'user': qn(ReadState._meta.get_field('user').column),
+            'col': qn(ReadState._meta.get_field('lastread').column),
+        }
+        if connection.vendor == 'mysql':
+            return 'ON DUPLICATE KEY UPDATE %(col)s = ' \
+                   'GREATEST(%(col)s, VALUES(%(col)s))' % names
+        if connection.vendor == 'sqlite':
+            supported = connection.Database.sqlite_version_info >= (3, 24)
+        elif connection.vendor == 'postgresql':
+            supported = connection.pg_version >= 90500
+        else:
+            supported = False
+        if not supported:
+            return None
+        return 'ON CONFLICT (%(issue)s, %(user)s) DO UPDATE ' \
+               'SET %(col)s = excluded.%(col)s ' \
+               'WHERE excluded.%(col)s > %(table)s.%(col)s' % names
+
+    @staticmethod
+    def upsert(issue, user, date):
+        """
+        Save the date the user read the issue (by primary keys) with the
+        ORM, unless an older date is saved.
+        """
+        states = ReadState.objects.filter(issue_id=issue, user_id=user)
+        if not states.filter(lastread__lt=date).update(lastread=date):
+            ReadState.objects.get_or_create(issue_id=issue, user_id=user,
+                    defaults={'lastread': date})
+
+    @staticmethod
+    def bulk_upsert(reads):
+        """
+        Save the dates the users read the issues, given as (issue pk,
+        project pk, user pk, date) tuples, with one upsert query by batch of
+        reads where the database supports it, and update the unread counters
+        accordingly. Dates older than the saved ones are ignored.
+        """
+        pairs = ProjectUnreadCounter.get_read_issues(reads)
+        ReadState.save_reads(reads)
+        ProjectUnreadCounter.count_reads(reads, pairs)
+
+    @staticmethod
+    def save_reads(reads):
+        """
+        Save the reads as bulk_upsert does, without updating the unread
+        counters.
+        """
+        clause = ReadState.get_upsert_clause()
+        if clause is None:
+            for issue, project, user, date in reads:
+                ReadState.upsert(issue, user, date)
+        else:
+            field = ReadState._meta.get_field('lastread')
+            qn = connection.ops.quote_name
+            columns = ', '.join([qn(ReadState._meta.get_field(name).column)
+                    for name in ('issue', 'user', 'lastread')])
+            # three parameters by read
+            for batch in chunks(reads, CHUNK_SIZE // 3):
+                params = []
+                for issue, project, user, date in batch:
+                    params += [issue, user,
+                            field.get_db_prep_value(date, connection)]
+                with connection.cursor() as cursor:
+                    cursor.execute('INSERT INTO %s (%s) VALUES %s %s' % (
+                        qn(ReadState._meta.db_table), columns,
+                        ', '.join(['(%s, %s, %s)'] * len(batch)),
+                        clause), params)
+
+    @staticmethod
+    def unread(date):
+        """
+        Query on objects annotated by annotate_lastread, matching those whose
+        date field is more recent than both dates the user read them.
+        """
+        issue = Q(lastread__isnull=True) | Q(lastread__lt=F(date))
+        project = Q(project_lastread__isnull=True) | \
+            Q(project_lastread__lt=F(date))
+        return issue & project
+
+
+class ProjectReadState(models.Model):
+
+    """
+    Date the user marked the whole project as read: issues not updated since
+    are read, whatever their own read state.
+    """
+
+    project = models.ForeignKey(Project, related_name="%(class)ss",
+            on_delete=models.CASCADE)
+
+    user = models.ForeignKey(User, related_name='%(class)ss',
+            on_delete=models.CASCADE)
+
+    lastread = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('project', 'user')
+
+    def __str__(self):
+        return "%s : User=%s lastread=%s" % (self.project, self.user,
+                self.lastread)
+
+
+# Parameters given at once to a query, to stay below the limit of some
+# databases.
+CHUNK_SIZE = 500
+
+
+def chunks(items, size=CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+@python_2_unicode_compatible
+class ProjectUnreadCounter(models.Model):
+
+    """
+    Number of issues of the project unread by the user.
+
+    Counters only exist for the users who read issues of the project, the
+    others never read any of them. They are created on the first read,
+    maintained by tracker.signals when events are created and issues
+    deleted, and rebuilt by the repair_unread_counters command.
+    """
+
+    project = models.ForeignKey(Project, related_name="%(class)ss",
+            on_delete=models.CASCADE)
+
+    user = models.ForeignKey(User, related_name='%(class)ss',
+            on_delete=models.CASCADE)
+
+    issues = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('project', 'user')
+
+    def __str__(self):
+        return "%s : User=%s issues=%s" % (self.project, self.user,
+                self.issues)
+
+    @staticmethod
+    def readers(issue, project, date):
+        """
+        Query on counters, matching the users who read the issue (by primary
+        keys) since the date.
+        """
+        issue_readers = ReadState.objects \
+            .filter(issue_id=issue, lastread__gte=date).values('user')
+        project_readers = ProjectReadState.objects \
+            .filter(project_id=project, lastread__gte=date).values('user')
+        return Q(user__in=issue_readers) | Q(user__in=project_readers)
+
+    @staticmethod
+    def count_issue(issue):
+        """
+        Count the new issue as unread by every user.
+        """
+        ProjectUnreadCounter.objects.filter(project_id=issue.project_id) \
+            .update(issues=F('issues') + 1)
+
+    @staticmethod
+    def count_event(event):
+        """
+        Count the issue of the new event as unread by the users who had
+        read it, the others being already counted.
+        """
+        issue = event.issue
+        previous = Event.objects.filter(issue_id=issue.pk) \
+            .exclude(pk=event.pk).aggregate(date=Max('date'))['date']
+        if previous is None:
+            previous = issue.opened_at
+        ProjectUnreadCounter.objects \
+            .filter(ProjectUnreadCounter.readers(issue.pk, issue.project_id,
+                    previous), project_id=issue.project_id) \
+            .update(issues=F('issues') + 1)
+
+    @staticmethod
+    def uncount_issue(issue):
+        """
+        Uncount the issue, about to be deleted, from the users who did not
+        read it.
+        """
+        ProjectUnreadCounter.objects \
+            .filter(project_id=issue.project_id, issues__gt=0) \
+            .exclude(ProjectUnreadCounter.readers(issue.pk,
+                    issue.project_id, issue.last_activity)) \
+            .update(issues=F('issues') - 1)
+
+    @staticmethod
+    def get_read_issues(reads):
+        """
+        Return the (project pk, user pk) pairs of the reads, given as (issue
+        pk, project pk, user pk, date) tuples, of issues that were unread and
+        will be read, once for each issue.
+        """
+        issues = set(read[0] for read in reads)
+        projects = set(read[1] for read in reads)
+        users = set(read[2] for read in reads)
+        last_activity = dict(Issue.objects.filter(pk__in=issues)
+                .values_list('pk', 'last_activity'))
+        # the dates the users read the issues, and their whole projects
+        lastread = {}
+        project_dates = ProjectReadState.objects \
+            .filter(project__in=projects, user__in=users) \
+            .annotate(kind=Value('project', models.CharField())) \
+            .values_list('kind', 'project', 'user', 'lastread')
+        dates = ReadState.objects \
+            .filter(issue__in=issues, user__in=users) \
+            .annotate(kind=Value('issue', models.CharField())) \
+            .values_list('kind', 'issue', 'user', 'lastread') \
+            .union(project_dates, all=True)
+        for kind, key, user, date in dates:
+            lastread[kind, key, user] = date
+        pairs = []
+        for issue, project, user, date in reads:
+            activity = last_activity.get(issue)
+            if activity is None or date < activity:
+                continue
+            dates = [lastread.get(('issue', issue, user)),
+                     lastread.get(('project', project, user))]
+            dates = [date for date in dates if date is not None]
+            if not dates or max(dates) < activity:
+                pairs.append((project, user))
+        return pairs
+
+    @staticmethod
+    def count_reads(reads, pairs):
+        """
+        Uncount the issues newly read, given as (project pk, user pk) pairs
+        by get_read_issues, once the reads are saved. Counters of the users
+        who did not read the projects yet are created, unless concurrent
+        reads just did.
+        """
+        counted = set(read[1:3] for read in reads)
+        existing = set(ProjectUnreadCounter.objects
+                .filter(project__in=set(project for project, user in counted),
+                        user__in=set(user for project, user in counted))
+                .values_list('project', 'user'))
+        uncounted = defaultdict(int)
+        for pair in pairs:
+            if pair in existing:
+                uncounted[pair] += 1
+        for (project, user), count in uncounted.items():
+            counters = ProjectUnreadCounter.objects \
+                .filter(project_id=project, user_id=user)
+            if not counters.filter(issues__gte=count) \
+                    .update(issues=F('issues') - count):
+                logger.warning("Unread counter of project %s and user %s "
+                               "below the %d issues read, reset to 0; run "
+                               "repair_unread_counters to rebuild it.",
+                               project, user, count)
+                counters.update(issues=0)
+        for project, user in counted - existing:
+            try:
+                with transaction.atomic():
+                    ProjectUnreadCounter.objects.create(project_id=project,
+                            user_id=user,
+                            issues=ProjectUnreadCounter.count(project, user))
+            except IntegrityError:
+                # created by concurrent reads since
+                pass
+
+    @staticmethod
+    def count(project, user):
+        """
+        Return the number of issues of the project (by primary key) unread by
+        the user (by primary key), computed from the read states.
+        """
+        issues = ReadState.annotate_lastread(
+            Issue.objects.filter(project_id=project), user)
+        return issues.filter(ReadState.unread('last_activity')).count()
+
+    @staticmethod
+    def annotate_unread(projects, user):
+        """
+        Return the projects, given as a queryset or primary keys, annotated
+        with the number of issues unread by the user (unread), all issues
+        being unread in the projects the user never read.
+        """
+        counter = ProjectUnreadCounter.objects \
+            .filter(project=OuterRef('pk'), user=user).values('issues')
+        issues = Issue.objects.filter(project=OuterRef('pk')) \
+            .order_by().values('project') \
+            .annotate(count=Count('pk')).values('count')
+        return Project.objects.filter(pk__in=projects) \
+            .annotate(unread=Coalesce(Subquery(counter), Subquery(issues),
+                    0, output_field=models.IntegerField()))
+
+    @staticmethod
+    def get_counts(projects, user):
+        """
+        Return a dict giving the number of unread issues of each of the
+        projects, by primary key.
+        """
+        if not user.is_authenticated:
+            return {}
+        return dict(ProjectUnreadCounter.annotate_unread(projects, user)
+                .values_list('pk', 'unread'))
+
+    @staticmethod
+    def get_total(projects, user):
+        """
+        Return the number of unread issues of the user in the projects.
+        """
+        if not user.is_authenticated:
+            return 0
+        return ProjectUnreadCounter.annotate_unread(projects, user) \
+            .aggregate(total=Coalesce(Sum('unread'), 0))['total']
+
 
 @python_2_unicode_compatible
 class Event(models.Model):
@@ -430,6 +890,35 @@ class Event(models.Model):
 
     additionnal_section = models.TextField(blank=True, default="")
 
+    # Typed arguments of the label and milestone events, the other ones
+    # being stored as JSON in _args.
+
+    label = models.ForeignKey(Label, blank=True, null=True, related_name='+',
+            on_delete=models.SET_NULL)
+
+    milestone_name = models.CharField(max_length=32, blank=True, default="")
+
+    old_milestone_name = models.CharField(max_length=32, blank=True,
+            default="")
+
+    @staticmethod
+    def load_labels(events):
+        """
+        Resolve with a single query the labels of the label events, so that
+        rendering them does not cost one query per event. Labels belong to
+        the project of the issue of their event, which is not loaded again.
+        """
+        events = [event for event in events if event.label_id is not None]
+        events = [event for event in events
+                if not Event.label.is_cached(event)]
+        labels = Label.objects.in_bulk(set(event.label_id
+                for event in events))
+        for event in events:
+            label = labels.get(event.label_id)
+            if label is not None:
+                label.project = event.issue.project
+            event.label = label
+
     def editable(self):
 
         return self.code == Event.COMMENT or self.code == Event.DESCRIBE
@@ -454,166 +943,113 @@ class Event(models.Model):
             return not self.issue.events.filter(code=Event.COMMENT, date__gt=self.date).exists()
         return True
 
-    def glyphicon(self):
+    def describe_rename(self, activity):
+        if activity:
+            return "changed the title of issue"
+        args = {k: escape(v) for k, v in self.args.items()}
+        return "changed the title from <mark>%s</mark> " \
+               "to <mark>%s</mark>" % (args['old_title'], args['new_title'])
 
-        if self.code == Event.COMMENT:
-            return "comment"
-        elif self.code == Event.DESCRIBE:
-            return "edit"
-        elif self.code == Event.CLOSE:
-            return "ban-circle"
-        elif self.code == Event.REOPEN:
-            return "refresh"
-        elif self.code == Event.RENAME:
-            return "transfer"
-        elif self.code == Event.ADD_LABEL \
-                or self.code == Event.DEL_LABEL:
-            return "tag"
-        elif self.code == Event.SET_MILESTONE \
-                or self.code == Event.CHANGE_MILESTONE \
-                or self.code == Event.UNSET_MILESTONE:
-            return "road"
-        elif self.code == Event.REFERENCE:
-            return "transfer"
-        elif self.code == Event.ASSIGN \
-                or self.code == Event.UNASSIGN:
-            return "user"
-        elif self.code == Event.SET_DUE_DATE \
-                or self.code == Event.CHANGE_DUE_DATE \
-                or self.code == Event.UNSET_DUE_DATE:
-            return "calendar"
+    def describe_label(self, activity):
+        if self.code == Event.ADD_LABEL:
+            action = 'added'
         else:
-            return "cog"
-
-    def activity(self):
+            action = 'removed'
+        label = self.label
+        if label is None:
+            description = '%s a deleted label' % action
+        else:
+            description = '%s the <a href="%s" class="label" ' \
+                          'style="%s">%s</a> label' \
+                          % (action, label.url, label.style, label)
+        if activity:
+            description += ' to issue'
+        return description
 
-        args = {k: escape(v) for k, v in self.args.items()}
+    def milestone_link(self, name):
+        name = escape(name)
+        return '<span class="glyphicon glyphicon-road"></span> ' \
+               '<a href="%s?q=is:open%%20milestone:%s"><b>%s</b></a>' \
+               % (self.issue.project.issues_url, name, name)
 
-        if self.code == Event.DESCRIBE:
-            description = "created issue"
-        elif self.code == Event.COMMENT:
-            description = "commented on issue"
-        elif self.code == Event.CLOSE:
-            description = "closed issue"
-        elif self.code == Event.REOPEN:
-            description = "reopened issue"
-        elif self.code == Event.RENAME:
-            description = "changed the title of issue"
-        elif self.code == Event.ADD_LABEL or self.code == Event.DEL_LABEL:
-            label = Label.objects.get(id=args['label'])
-            if self.code == Event.ADD_LABEL:
+    def describe_milestone(self, activity):
+        milestone = self.milestone_link(self.milestone_name)
+        if not activity:
+            if self.code == Event.SET_MILESTONE:
                 action = 'added'
             else:
                 action = 'removed'
-            description = '%s the <a href="%s" class="label" ' \
-                          'style="%s">%s</a> label to issue' \
-                          % (action, label.url, label.style, label)
-        elif self.code == Event.SET_MILESTONE \
-                or self.code == Event.UNSET_MILESTONE:
-            milestone = Milestone(name=args['milestone'],
-                    project=self.issue.project)
-            if self.code == Event.SET_MILESTONE:
-                action = 'added to'
-            else:
-                action = 'removed from'
-            description = '%s the <span class="glyphicon ' \
-                          'glyphicon-road"></span> <a href="%s">' \
-                          '<b>%s</b></a> milestone the issue' \
-                          % (action, milestone.url, milestone)
-        elif self.code == Event.CHANGE_MILESTONE:
-            old_ms = Milestone(name=args['old_milestone'],
-                    project=self.issue.project)
-            new_ms = Milestone(name=args['new_milestone'],
-                    project=self.issue.project)
-            description = 'moved from the <span class="glyphicon ' \
-                          'glyphicon-road"></span> <a href="%s">' \
-                          '<b>%s</b></a> milestone ' \
-                          'to the <span class="glyphicon ' \
-                          'glyphicon-road"></span> <a href="%s">' \
-                          '<b>%s</b></a> milestone the issue' \
-                          % (old_ms.url, old_ms, new_ms.url, new_ms)
-        elif self.code == Event.REFERENCE:
-            description = "referenced the issue"
-        elif self.code == Event.SET_DUE_DATE:
+            return '%s this to the %s milestone' % (action, milestone)
+        if self.code == Event.SET_MILESTONE:
+            action = 'added to'
+        else:
+            action = 'removed from'
+        return '%s the %s milestone the issue' % (action, milestone)
+
+    def describe_milestone_change(self, activity):
+        old_milestone = self.milestone_link(self.old_milestone_name)
+        milestone = self.milestone_link(self.milestone_name)
+        if activity:
+            return 'moved from the %s milestone to the %s milestone ' \
+                   'the issue' % (old_milestone, milestone)
+        return 'moved this from the %s milestone to the %s milestone' \
+               % (old_milestone, milestone)
+
+    def describe_due_date(self, activity):
+        args = self.args
+        if self.code == Event.SET_DUE_DATE:
             due_date = datetime.fromtimestamp(float(args['due_date']))
-            description = 'set the due date to <em>%s</em> of issue' \
-                          % due_date
+            description = 'set the due date to <em>%s</em>' % due_date
         elif self.code == Event.CHANGE_DUE_DATE:
             old_due_date = datetime.fromtimestamp(float(args['old_due_date']))
             new_due_date = datetime.fromtimestamp(float(args['new_due_date']))
             description = 'changed the due date from <em>%s</em> to ' \
-                          '<em>%s</em> of issue' \
-                          % (old_due_date, new_due_date)
-        elif self.code == Event.UNSET_DUE_DATE:
-            description = 'removed the due date of issue'
+                          '<em>%s</em>' % (old_due_date, new_due_date)
         else:
-            return None
-
+            description = 'removed the due date'
+        if activity:
+            description += ' of issue'
         return description
 
-    def __str__(self):
+    # Code -> (glyphicon, description in the issue, description in the
+    # project activity). Descriptions are strings, or methods called with
+    # whether the description is for the activity.
+    DESCRIPTIONS = {
+        COMMENT: ("comment", "commented", "commented on issue"),
+        DESCRIBE: ("edit", "commented", "created issue"),
+        CLOSE: ("ban-circle", "closed this issue", "closed issue"),
+        REOPEN: ("refresh", "reopened this issue", "reopened issue"),
+        RENAME: ("transfer", describe_rename, describe_rename),
+        ADD_LABEL: ("tag", describe_label, describe_label),
+        DEL_LABEL: ("tag", describe_label, describe_label),
+        SET_MILESTONE: ("road", describe_milestone, describe_milestone),
+        CHANGE_MILESTONE: ("road", describe_milestone_change,
+                           describe_milestone_change),
+        UNSET_MILESTONE: ("road", describe_milestone, describe_milestone),
+        REFERENCE: ("transfer", "referenced this issue",
+                    "referenced the issue"),
+        ASSIGN: ("user", None, None),
+        UNASSIGN: ("user", None, None),
+        SET_DUE_DATE: ("calendar", describe_due_date, describe_due_date),
+        CHANGE_DUE_DATE: ("calendar", describe_due_date, describe_due_date),
+        UNSET_DUE_DATE: ("calendar", describe_due_date, describe_due_date),
+    }
 
-        args = {k: escape(v) for k, v in self.args.items()}
+    def glyphicon(self):
+        if self.code in Event.DESCRIPTIONS:
+            return Event.DESCRIPTIONS[self.code][0]
+        return "cog"
 
-        if self.code == Event.COMMENT or self.code == Event.DESCRIBE:
-            description = "commented"
-        elif self.code == Event.CLOSE:
-            description = "closed this issue"
-        elif self.code == Event.REOPEN:
-            description = "reopened this issue"
-        elif self.code == Event.RENAME:
-            description = "changed the title from <mark>%s</mark> " \
-                          "to <mark>%s</mark>" \
-                          % (args['old_title'], args['new_title'])
-        elif self.code == Event.ADD_LABEL or self.code == Event.DEL_LABEL:
-            label = Label.objects.get(id=args['label'])
-            if self.code == Event.ADD_LABEL:
-                action = 'added'
-            else:
-                action = 'removed'
-            description = '%s the <a href="%s" class="label" ' \
-                          'style="%s">%s</a> label' \
-                          % (action, label.url, label.style, label)
-        elif self.code == Event.SET_MILESTONE \
-                or self.code == Event.UNSET_MILESTONE:
-            milestone = Milestone(name=args['milestone'],
-                    project=self.issue.project)
-            if self.code == Event.SET_MILESTONE:
-                action = 'added'
-            else:
-                action = 'removed'
-            description = '%s this to the <span class="glyphicon ' \
-                          'glyphicon-road"></span> <a href="%s">' \
-                          '<b>%s</b></a> milestone' \
-                          % (action, milestone.url, milestone)
-        elif self.code == Event.CHANGE_MILESTONE:
-            old_ms = Milestone(name=args['old_milestone'],
-                    project=self.issue.project)
-            new_ms = Milestone(name=args['new_milestone'],
-                    project=self.issue.project)
-            description = 'moved this from the <span class="glyphicon ' \
-                          'glyphicon-road"></span> <a href="%s">' \
-                          '<b>%s</b></a> milestone ' \
-                          'to the <span class="glyphicon ' \
-                          'glyphicon-road"></span> <a href="%s">' \
-                          '<b>%s</b></a> milestone' \
-                          % (old_ms.url, old_ms, new_ms.url, new_ms)
-        elif self.code == Event.REFERENCE:
-            description = "referenced this issue"
-        elif self.code == Event.REFERENCE:
-            description = "referenced the issue"
-        elif self.code == Event.SET_DUE_DATE:
-            due_date = datetime.fromtimestamp(float(args['due_date']))
-            description = 'set the due date to <em>%s</em>' \
-                          % due_date
-        elif self.code == Event.CHANGE_DUE_DATE:
-            old_due_date = datetime.fromtimestamp(float(args['old_due_date']))
-            new_due_date = datetime.fromtimestamp(float(args['new_due_date']))
-            description = 'changed the due date from <em>%s</em> to <em>%s</em>' \
-                          % (old_due_date, new_due_date)
-        elif self.code == Event.UNSET_DUE_DATE:
-            description = 'removed the due date'
-        else:
+    def describe(self, activity=False):
+        if self.code not in Event.DESCRIPTIONS:
             return None
-
+        description = Event.DESCRIPTIONS[self.code][2 if activity else 1]
+        if callable(description):
+            description = description(self, activity)
         return description
+
+    def activity(self):
+        return self.describe(activity=True)
+
+    def __str__(self):
+        return self.describe()
@@ -10,7 +10,9 @@ if 'djcelery' in settings.INSTALLED_APPS:
     from tracker.tasks import send_mails
 
 from accounts.models import User
+from tracker.models import Project
 from tracker.utils import get_message_id, get_reply_addr
+from permissions.backends import get_users_with_access
 
 
 __all__ = [
@@ -19,10 +21,21 @@ __all__ = [
 ]
 
 
+def filter_dests(project, dests):
+
+    # subscribers may have lost access to a private project
+    if project.access == Project.ACCESS_PRIVATE:
+        dests = dests.filter(
+            id__in=get_users_with_access(project).values('id'))
+
+    return dests
+
+
 def notify_new_issue(issue):
 
     project = issue.project
     dests = project.subscribers.all().distinct()
+    dests = filter_dests(project, dests)
 
     subject = "[%s] %s" % (project, issue.title)
     sender = issue.author
@@ -58,6 +71,7 @@ def notify_event(event, template):
     dests = issue.subscribers.all()
     dests |= project.subscribers.all()
     dests = dests.distinct()
+    dests = filter_dests(project, dests)
 
     subject = "Re: [%s] %s" % (project, issue.title)
     sender = event.author
@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+import atexit
+import logging
+import threading
+
+from tracker.models import Issue, ReadState
+
+
+__all__ = ['mark_as_read', 'flush']
+
+
+"""
+Displaying an issue marks it as read, which turns each page view into a
+write. With TRACKER_READSTATE_DELAY set to a number of seconds, reads are
+buffered per process instead and saved in batches by ReadState.bulk_upsert,
+once the delay passed since the first buffered read or once
+TRACKER_READSTATE_BATCH reads (100 by default) are buffered, whichever comes
+first. The delay defaults to 0: reads are then saved synchronously.
+
+Buffers are not shared between processes. Buffered reads are saved when the
+process exits normally, but lost if it is killed, the issues being shown
+unread again; failures to save them are logged.
+"""
+
+
+logger = logging.getLogger(__name__)
+
+lock = threading.Lock()
+# (issue pk, user pk) -> (project pk, date)
+buffer = {}
+timer = None
+registered = False
+
+
+def get_delay():
+    return getattr(settings, 'TRACKER_READSTATE_DELAY', 0)
+
+
+def get_batch():
+    return getattr(settings, 'TRACKER_READSTATE_BATCH', 100)
+
+
+def mark_as_read(issue, user):
+    """
+    Same as Issue.mark_as_read, but buffer the write: return the date the
+    user previously read the issue, taking buffered reads into account.
+    """
+    if not user.is_authenticated or not get_delay():
+        return issue.mark_as_read(user)
+    global timer, registered
+    key = (issue.pk, user.pk)
+    with lock:
+        pending = buffer.get(key)
+    olddate = issue.get_lastread(user)
+    if pending is not None and (olddate is None or pending[1] > olddate):
+        olddate = pending[1]
+    with lock:
+        buffer[key] = (issue.project_id, timezone.now())
+        full = len(buffer) >= get_batch()
+        if not registered:
+            atexit.register(flush)
+            registered = True
+        if not full and timer is None:
+            timer = threading.Timer(get_delay(), flush_in_thread)
+            timer.daemon = True
+            timer.start()
+    if full:
+        flush()
+    return olddate or issue.opened_at
+
+
+def flush():
+    """
+    Save the buffered reads.
+    """
+    global timer
+    with lock:
+        reads = [(issue, project, user, date)
+                for (issue, user), (project, date) in buffer.items()]
+        buffer.clear()
+        if timer is not None:
+            timer.cancel()
+            timer = None
+    if not reads:
+        return
+    try:
+        # issues may have been deleted since read
+        issues = set(Issue.objects
+                .filter(pk__in=set(read[0] for read in reads))
+                .values_list('pk', flat=True))
+        with transaction.atomic():
+            ReadState.bulk_upsert([read for read in reads
+                    if read[0] in issues])
+    except Exception:
+        logger.exception("Could not save %d read states.", len(reads))
+
+
+def flush_in_thread():
+    try:
+        flush()
+    finally:
+        # the connection opened by this thread
+        connection.close()
@@ -1,8 +1,16 @@
-from django.db.models.signals import post_save
+from django.db.models import F, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, pre_delete, post_delete
+from django.db.models.signals import m2m_changed
 from django.dispatch import receiver
 from django.contrib.sites.models import Site
 
-from tracker.models import Settings, Project, Label
+from tracker.models import Settings, Project, Label, Milestone, Issue, Event
+from tracker.models import ProjectUnreadCounter
+from tracker import cache as tracker_cache
+from accounts.models import User, Group, Team
+
+import threading
 
 
 def create_default_settings(sender, **kwargs):
@@ -18,3 +26,199 @@ def create_default_project_labels(sender, instance, created, **kwargs):
         Label(project=instance, name='bug', color='#FF0000').save()
         Label(project=instance, name='feature', color='#00A000').save()
         Label(project=instance, name='documentation', color='#1D3DBE').save()
+
+
+"""
+Deleting an issue, alone or with its project, deletes its events first: the
+receivers of the events skip the issues being deleted, which are not worth
+updating, and the receivers of the issues invalidate their project once.
+"""
+
+
+class Deletions(threading.local):
+
+    """
+    Primary keys of the issues being deleted by the current thread: events
+    saved or deleted by other threads must still update them.
+    """
+
+    def __init__(self):
+        self.issues = set()
+
+
+deletions = Deletions()
+
+
+@receiver(pre_delete, sender=Issue, dispatch_uid="Track deleted issues.")
+def start_issue_deletion(sender, instance, **kwargs):
+    deletions.issues.add(instance.pk)
+
+
+@receiver(post_delete, sender=Issue, dispatch_uid="Untrack deleted issues.")
+def end_issue_deletion(sender, instance, **kwargs):
+    deletions.issues.discard(instance.pk)
+
+
+@receiver(post_save, sender=Event,
+          dispatch_uid="Issue last activity on event save.")
+@receiver(post_delete, sender=Event,
+          dispatch_uid="Issue last activity on event delete.")
+def update_issue_last_activity(sender, instance, **kwargs):
+    if instance.issue_id in deletions.issues:
+        return
+    last_event = Event.objects.filter(issue=OuterRef('pk')) \
+        .order_by('-date').values('date')[:1]
+    Issue.objects.filter(pk=instance.issue_id) \
+        .update(last_activity=Coalesce(Subquery(last_event), 'opened_at'))
+
+
+@receiver(post_save, sender=Event,
+          dispatch_uid="Issue comment count on event save.")
+def increment_issue_comment_count(sender, instance, created, raw, **kwargs):
+    if not created or instance.code != Event.COMMENT:
+        return
+    issues = Issue.objects.filter(pk=instance.issue_id)
+    if raw:
+        # loaded issues may already count this comment
+        comments = Event.objects \
+            .filter(issue=OuterRef('pk'), code=Event.COMMENT) \
+            .order_by().values('issue').annotate(count=Count('pk'))
+        issues.update(comment_count=Coalesce(
+            Subquery(comments.values('count')), 0))
+    else:
+        issues.update(comment_count=F('comment_count') + 1)
+
+
+@receiver(post_delete, sender=Event,
+          dispatch_uid="Issue comment count on event delete.")
+def decrement_issue_comment_count(sender, instance, **kwargs):
+    deleted = instance.issue_id in deletions.issues
+    if instance.code != Event.COMMENT or deleted:
+        return
+    Issue.objects.filter(pk=instance.issue_id, comment_count__gt=0) \
+        .update(comment_count=F('comment_count') - 1)
+
+
+"""
+Unread counters count new issues for every user, and the issue of a new
+event for the users who had read it. Deleted events are not uncounted, the
+repair_unread_counters command fixes the counters.
+"""
+
+
+@receiver(post_save, sender=Issue,
+          dispatch_uid="Unread counters on issue save.")
+def count_unread_issue(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        ProjectUnreadCounter.count_issue(instance)
+
+
+@receiver(post_save, sender=Event,
+          dispatch_uid="Unread counters on event save.")
+def count_unread_event(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        ProjectUnreadCounter.count_event(instance)
+
+
+@receiver(pre_delete, sender=Issue,
+          dispatch_uid="Unread counters on issue delete.")
+def uncount_unread_issue(sender, instance, **kwargs):
+    ProjectUnreadCounter.uncount_issue(instance)
+
+
+"""
+Compiled issue filters refer to labels, milestones and users by id, they
+must be compiled again when one of them is renamed or deleted.
+"""
+
+
+@receiver(post_save, sender=Label,
+          dispatch_uid="Invalidate filters on label save.")
+@receiver(post_delete, sender=Label,
+          dispatch_uid="Invalidate filters on label delete.")
+@receiver(post_save, sender=Milestone,
+          dispatch_uid="Invalidate filters on milestone save.")
+@receiver(post_delete, sender=Milestone,
+          dispatch_uid="Invalidate filters on milestone delete.")
+def invalidate_project_filters(sender, instance, **kwargs):
+    tracker_cache.invalidate('filters', instance.project_id)
+
+
+@receiver(post_save, sender=User,
+          dispatch_uid="Invalidate filters on user save.")
+def invalidate_filters_on_user_save(sender, update_fields, **kwargs):
+    # do not invalidate everything on each login
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    tracker_cache.invalidate('filters')
+
+
+@receiver(post_delete, sender=User,
+          dispatch_uid="Invalidate filters on user delete.")
+def invalidate_filters_on_user_delete(sender, **kwargs):
+    tracker_cache.invalidate('filters')
+
+
+"""
+Issue lists are cached until the next change in their project.
+"""
+
+
+@receiver(post_save, sender=Issue,
+          dispatch_uid="Invalidate issues on issue save.")
+@receiver(post_delete, sender=Issue,
+          dispatch_uid="Invalidate issues on issue delete.")
+@receiver(post_save, sender=Label,
+          dispatch_uid="Invalidate issues on label save.")
+@receiver(post_delete, sender=Label,
+          dispatch_uid="Invalidate issues on label delete.")
+@receiver(post_save, sender=Milestone,
+          dispatch_uid="Invalidate issues on milestone save.")
+@receiver(post_delete, sender=Milestone,
+          dispatch_uid="Invalidate issues on milestone delete.")
+def invalidate_project_issues(sender, instance, **kwargs):
+    tracker_cache.invalidate('issues', instance.project_id)
+
+
+@receiver(post_save, sender=Event,
+          dispatch_uid="Invalidate issues on event save.")
+@receiver(post_delete, sender=Event,
+          dispatch_uid="Invalidate issues on event delete.")
+def invalidate_project_issues_on_event(sender, instance, **kwargs):
+    if instance.issue_id not in deletions.issues:
+        tracker_cache.invalidate('issues', instance.issue.project_id)
+
+
+@receiver(m2m_changed, sender=Issue.labels.through,
+          dispatch_uid="Invalidate issues on issue labels change.")
+def invalidate_project_issues_on_labels(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        tracker_cache.invalidate('issues', instance.project_id)
+
+
+"""
+Counts of users, groups and teams are cached until one of them changes.
+"""
+
+
+@receiver(post_save, sender=User,
+          dispatch_uid="Invalidate accounts on user save.")
+def invalidate_accounts_on_user_save(sender, update_fields, **kwargs):
+    # do not invalidate everything on each login
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    tracker_cache.invalidate('accounts')
+
+
+@receiver(post_delete, sender=User,
+          dispatch_uid="Invalidate accounts on user delete.")
+@receiver(post_save, sender=Group,
+          dispatch_uid="Invalidate accounts on group save.")
+@receiver(post_delete, sender=Group,
+          dispatch_uid="Invalidate accounts on group delete.")
+@receiver(post_save, sender=Team,
+          dispatch_uid="Invalidate accounts on team save.")
+@receiver(post_delete, sender=Team,
+          dispatch_uid="Invalidate accounts on team delete.")
+def invalidate_accounts(sender, **kwargs):
+    tracker_cache.invalidate('accounts')
@@ -1,18 +1,142 @@
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.core.management import call_command
 from django.urls import reverse
+from django.db import connection
+from django.contrib.sites.models import Site
+from django.utils import timezone
+
+from contextlib import contextmanager
+import threading
 
 from tracker.models import *
 from accounts.models import User
 from permissions.models import PermissionModel as PermModel
+from tracker.utils import IssueManager, Paginator
+from tracker import cache as tracker_cache
+from permissions import cache as perms_cache
+from tracker import readstates
+from tracker import signals
+from tracker.utils.issue_manager import SORT_VALUES
+
+
+class QueryBudgetMixin(object):
+
+    """
+    Views must render in a fixed number of queries, whatever the amount of
+    data displayed. Caches are emptied before each test so that the numbers
+    do not depend on the tests run before.
+    """
+
+    def setUp(self):
+        super(QueryBudgetMixin, self).setUp()
+        self.clear_caches()
+
+    def clear_caches(self):
+        # the current site is cached by the process, with its settings
+        Site.objects.clear_cache()
+        perms_cache.get_cache().clear()
+        tracker_cache.get_cache().clear()
+        perms_cache.invalidate_perms()
+
+    @contextmanager
+    def assertQueryBudget(self, budget, name=''):
+        with CaptureQueriesContext(connection) as context:
+            yield
+        queries = '\n'.join(query['sql'] for query in context.captured_queries)
+        self.assertEqual(len(context), budget,
+                "%s: %d queries executed, budget is %d\n%s"
+                % (name, len(context), budget, queries))
 
 
-class TestViews(TestCase):
+class TestViews(QueryBudgetMixin, TestCase):
 
     fixtures = ['test_tracker_views']
 
+    # Number of queries for rendering each view with cold caches, then
+    # again once cached, see test_query_budgets.
+    query_budgets = {
+        'list-project': (7, 6),
+        'list-issue': (16, 11),
+        'show-issue': (20, 14),
+        'show-activity': (11, 7),
+    }
+
     def setUp(self):
+        super(TestViews, self).setUp()
         self.client.login(username='admin', password='admin')
 
+    def test_query_budgets(self):
+        project = Project.objects.get(name='project-1')
+        author = User.objects.get(username='user1')
+        milestone = Milestone.objects.create(project=project, name='v1')
+        labels = list(project.labels.all())
+        # enough data for every list to show a full page, then more of
+        # everything: the budgets must not depend on the amount of data
+        for size in (1, 2):
+            for i in range(30 * size):
+                issue = Issue(project=project, id=Issue.next_id(project),
+                        title='Issue %d' % i, author=author,
+                        milestone=milestone)
+                issue.save()
+                issue.description = 'Issue %d.' % i
+                for label in labels[:size]:
+                    issue.add_label(author, label)
+            for i in range(10 * size):
+                Event(issue=issue, author=author, code=Event.COMMENT,
+                      additionnal_section='Comment %d.' % i).save()
+            # keep label events on the activity page
+            issue.add_label(author, labels[-1])
+            urls = {
+                'list-project': reverse('list-project'),
+                'list-issue': reverse('list-issue', args=[project.name]),
+                'show-issue': reverse('show-issue',
+                    args=[project.name, issue.id]),
+                'show-activity': reverse('show-activity',
+                    args=[project.name]),
+            }
+            # each size is visited by a user who never read the project
+            ReadState.objects.filter(user__username='admin').delete()
+            ProjectUnreadCounter.objects.filter(
+                user__username='admin').delete()
+            for name, url in sorted(urls.items()):
+                self.clear_caches()
+                for budget in self.query_budgets[name]:
+                    with self.assertQueryBudget(budget,
+                            '%s (size %d)' % (name, size)):
+                        response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+
+    @override_settings(TRACKER_READSTATE_DELAY=60,
+            TRACKER_READSTATE_BATCH=2)
+    def test_deferred_read_states(self):
+        project = Project.objects.get(name='project-1')
+        user = User.objects.get(username='admin')
+        issues = list(project.issues.all()[:2])
+        self.addCleanup(readstates.flush)
+        for issue in issues:
+            issue.readstates.all().delete()
+        Event(issue=issues[0], author=user, code=Event.COMMENT).save()
+        url = reverse('show-issue', args=[project.name, issues[0].id])
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        self.assertFalse([query for query in context.captured_queries
+                if not query['sql'].startswith('SELECT')])
+        self.assertFalse(issues[0].readstates.exists())
+        self.assertFalse(ProjectUnreadCounter.objects.filter(user=user)
+                .exists())
+        # the buffered read is taken into account
+        response = self.client.get(url)
+        self.assertGreater(response.context['lastread'],
+                issues[0].events.last().date)
+        # the second read fills the batch
+        self.client.get(reverse('show-issue',
+                args=[project.name, issues[1].id]))
+        for issue in issues:
+            self.assertFalse(issue.have_unread_message(user))
+        self.assertEqual(ProjectUnreadCounter.get_counts([project.pk], user),
+                {project.pk: ProjectUnreadCounter.count(project.pk, user.pk)})
+
     def test_markdown(self):
         response = self.client.get(reverse('markdown'))
         self.assertEqual(response.status_code, 405) # get method not allowed
@@ -26,6 +150,11 @@ class TestViews(TestCase):
             'data': '<script></script>',
         })
         self.assertNotContains(response, '<script>')
+        # projects granted to the user are never resolved
+        request = response.wsgi_request
+        self.assertFalse(hasattr(request.user, '_ponytracker_projects'))
+        self.assertIn(Project.objects.get(name='project-1'), request.projects)
+        self.assertTrue(hasattr(request.user, '_ponytracker_projects'))
 
     def test_admin(self):
         response = self.client.get(reverse('admin'))
@@ -254,6 +383,8 @@ class TestViews(TestCase):
         issue = project.issues.get(title='THE Issue 2')
         response = self.client.get(reverse('show-issue', args=[project.name, issue.id]))
         self.assertEqual(response.status_code, 200)
+        # permissions are loaded once for the whole page
+        self.assertEqual(response.context['perm'].hits, 1)
 
     def test_issue_comment_add(self):
         project = Project.objects.get(name='project-1')
@@ -548,3 +679,469 @@ class TestViews(TestCase):
         self.assertEqual(Milestone.objects.filter(project=project, deleted=False).count(), count_active - 1)
         self.assertEqual(Milestone.objects.filter(project=project, deleted=True).count(), count_deleted + 1)
         self.assertEqual(project.milestones.count(), count_active - 1)
+
+
+class TestModels(TestCase):
+
+    fixtures = ['test_tracker_views']
+
+    def test_issue_last_activity(self):
+        project = Project.objects.get(name='project-1')
+        author = User.objects.get(username='admin')
+        issue = Issue(project=project, id=Issue.next_id(project),
+                title='Issue', author=author)
+        issue.save()
+        # set when the issue is created
+        self.assertIsNotNone(Issue.objects.get(pk=issue.pk).last_activity)
+        issue.description = 'Description.'
+        first = Event.objects.get(issue=issue)
+        self.assertEqual(Issue.objects.get(pk=issue.pk).last_activity,
+                first.date)
+        event = Event(issue=issue, author=author, code=Event.COMMENT,
+                additionnal_section='Comment.')
+        event.save()
+        self.assertEqual(Issue.objects.get(pk=issue.pk).last_activity,
+                event.date)
+        # saving an outdated instance does not overwrite it
+        issue.title = 'Renamed issue'
+        issue.save()
+        self.assertEqual(Issue.objects.get(pk=issue.pk).last_activity,
+                event.date)
+        event.delete()
+        self.assertEqual(Issue.objects.get(pk=issue.pk).last_activity,
+                first.date)
+        # recently updated issue first
+        manager = IssueManager(project, 'is:open', 'recently-updated')
+        self.assertEqual(manager.issues.first(), issue)
+        manager = IssueManager(project, 'is:open', 'least-recently-updated')
+        self.assertEqual(manager.issues.last(), issue)
+        # back to the creation of the issue without events
+        first.delete()
+        self.assertEqual(Issue.objects.get(pk=issue.pk).last_activity,
+                Issue.objects.get(pk=issue.pk).opened_at)
+
+    def test_issue_comment_count(self):
+        project = Project.objects.get(name='project-1')
+        author = User.objects.get(username='admin')
+        issue = Issue(project=project, id=Issue.next_id(project),
+                title='Issue', author=author)
+        issue.save()
+        issue.description = 'Description.'
+        for i in range(3):
+            Event(issue=issue, author=author, code=Event.COMMENT,
+                  additionnal_section='Comment %d.' % i).save()
+        issue.save()
+        self.assertEqual(Issue.objects.get(pk=issue.pk).comment_count, 3)
+        issue.comments.first().delete()
+        self.assertEqual(Issue.objects.get(pk=issue.pk).comment_count, 2)
+        manager = IssueManager(project, 'is:open', 'most-commented')
+        self.assertEqual(manager.issues.first(), issue)
+        manager = IssueManager(project, 'is:open', 'least-commented')
+        self.assertEqual(manager.issues.last(), issue)
+
+    def test_issue_delete(self):
+        project = Project.objects.get(name='project-1')
+        author = User.objects.get(username='admin')
+
+        def create(comments):
+            issue = Issue(project=project, id=Issue.next_id(project),
+                    title='Issue', author=author)
+            issue.save()
+            issue.description = 'Description.'
+            for i in range(comments):
+                Event(issue=issue, author=author, code=Event.COMMENT,
+                      additionnal_section='Comment %d.' % i).save()
+            return Issue.objects.get(pk=issue.pk)
+        issue = create(1)
+        with CaptureQueriesContext(connection) as context:
+            issue.delete()
+        # the events of the deleted issue do not update it one by one
+        issue = create(10)
+        with self.assertNumQueries(len(context)):
+            issue.delete()
+        # events deleted alone still do
+        issue = create(2)
+        issue.comments.first().delete()
+        self.assertEqual(Issue.objects.get(pk=issue.pk).comment_count, 1)
+        # and issues being deleted are only skipped by the deleting thread
+        signals.start_issue_deletion(Issue, issue)
+        self.addCleanup(signals.end_issue_deletion, Issue, issue)
+        skipped = []
+        thread = threading.Thread(target=lambda: skipped.append(
+            issue.pk in signals.deletions.issues))
+        thread.start()
+        thread.join()
+        self.assertEqual(skipped, [False])
+        self.assertIn(issue.pk, signals.deletions.issues)
+
+    def test_filter_plan(self):
+        project = Project.objects.get(name='project-1')
+        filter = 'label:bug milestone:v1.0 author:admin label:bug due:no'
+        # one query per kind of name
+        with self.assertNumQueries(3):
+            manager = IssueManager(project, filter)
+        self.assertEqual(manager.status, 'is:open')
+        self.assertEqual(manager._constraints, [('label', 'bug'),
+                ('milestone', 'v1.0'), ('author', 'admin'), ('due', 'no')])
+        self.assertFalse(manager.not_used_labels.filter(name='bug').exists())
+        # the compiled filter is cached, whatever the spacing and quoting
+        with self.assertNumQueries(0):
+            manager = IssueManager(project, '  label:"bug" milestone:v1.0 '
+                    'author:admin label:bug due:no')
+        self.assertEqual(manager._constraints[0], ('label', 'bug'))
+        # until one of the names changes
+        label = project.labels.get(name='bug')
+        label.name = 'defect'
+        label.save()
+        manager = IssueManager(project, filter)
+        self.assertEqual(manager.error, "The label 'bug' does not exist "
+                                        "or has been deleted.")
+        self.assertEqual(manager._constraints, [])
+        # constraints preceding an error are applied
+        manager = IssueManager(project, 'due:no is:close foo:bar')
+        self.assertEqual(manager.error, "Unknown 'foo' filtering criterion.")
+        self.assertEqual(manager.status, 'is:close')
+        self.assertEqual(manager._constraints, [('due', 'no')])
+        manager = IssueManager(project, 'due:yes "label:bug')
+        self.assertEqual(manager.error,
+                'There is a syntax error in your filter.')
+
+    def test_filter_keys(self):
+        project = Project.objects.get(name='project-1')
+        user = User.objects.get(username='user1')
+        bug = project.labels.get(name='bug')
+        issues = list(project.issues.order_by('pk'))
+        issues[0].assignee = user
+        issues[0].due_date = timezone.now() - timezone.timedelta(days=10)
+        issues[0].save()
+        issues[0].add_label(user, bug)
+        issues[1].due_date = timezone.now() + timezone.timedelta(days=10)
+        issues[1].save()
+
+        def filter(filter):
+            manager = IssueManager(project, '* ' + filter)
+            self.assertIsNone(manager.error, filter)
+            return set(manager.issues)
+        today = timezone.localtime(timezone.now()).date()
+        self.assertEqual(filter('assignee:user1'), {issues[0]})
+        self.assertEqual(filter('due:<%s' % today), {issues[0]})
+        self.assertEqual(filter('due:>%s' % today), {issues[1]})
+        fresh = Issue(project=project, id=Issue.next_id(project),
+                title='Fresh issue', author=user)
+        fresh.save()
+        self.assertEqual(filter('opened:<%s' % today), set(issues))
+        yesterday = today - timezone.timedelta(days=1)
+        self.assertEqual(filter('opened:>%s' % yesterday), {fresh})
+        # created issues count as updated
+        self.assertEqual(filter('updated:>%s' % yesterday),
+                {issues[0], fresh})
+        self.assertEqual(filter('no:label'), set(project.issues
+                .filter(labels__isnull=True)))
+        self.assertNotIn(issues[0], filter('no:label'))
+        self.assertEqual(filter('no:milestone'), set(project.issues
+                .filter(milestone__isnull=True)))
+        self.assertEqual(filter('no:assignee'), set(issues[1:] + [fresh]))
+        for filter, error in (
+                ('due:<2017-13-01', "The keyword 'due' must be followed by "
+                    "'yes', 'no', '<YYYY-MM-DD' or '>YYYY-MM-DD'."),
+                ('opened:2017-01-01', "The keyword 'opened' must be followed "
+                    "by '<YYYY-MM-DD' or '>YYYY-MM-DD'."),
+                ('no:due', "The keyword 'no' must be followed by "
+                    "'label', 'milestone' or 'assignee'."),
+                ('assignee:nobody', "The user 'nobody' does not exist.")):
+            self.assertEqual(IssueManager(project, filter).error, error)
+
+    def test_issue_facets(self):
+        project = Project.objects.get(name='project-1')
+        user = User.objects.get(username='user1')
+        bug = project.labels.get(name='bug')
+        milestone = project.milestones.get(name='v1.0')
+        for issue in project.issues.all():
+            issue.mark_as_read(user)
+        issue = project.issues.filter(closed=False).first()
+        issue.add_label(user, bug)
+        issue.milestone = milestone
+        issue.save()
+        manager = IssueManager(project, 'is:open', user=user)
+        # the facets and the unread issues
+        with self.assertNumQueries(2):
+            facets = manager.facets
+        # only unread issues are counted once the facets are cached
+        with self.assertNumQueries(1):
+            self.assertEqual(IssueManager(project, 'is:open',
+                    user=user).facets, facets)
+        issues = project.issues
+        self.assertEqual(facets['status'], {
+            'is:open': issues.filter(closed=False).count(),
+            'is:close': issues.filter(closed=True).count(),
+            'is:unread': 1,
+            '*': issues.count(),
+        })
+        self.assertEqual(facets['label'][bug.pk],
+                issues.filter(closed=False, labels=bug).count())
+        self.assertEqual(facets['milestone'][milestone.pk],
+                issues.filter(closed=False, milestone=milestone).count())
+        # label and milestone counts are restricted to the listed issues
+        manager = IssueManager(project, 'is:close label:bug', user=user)
+        self.assertEqual(manager.facets['status']['is:open'],
+                issues.filter(closed=False, labels=bug).count())
+        self.assertEqual(manager.facets['label'].get(bug.pk, 0),
+                issues.filter(closed=True, labels=bug).count())
+        self.assertEqual(manager.facets['milestone'].get(milestone.pk, 0),
+                issues.filter(closed=True, labels=bug,
+                        milestone=milestone).count())
+
+    def test_issue_pages(self):
+        project = Project.objects.get(name='project-1')
+        author = User.objects.get(username='admin')
+        for i in range(12):
+            issue = Issue(project=project, id=Issue.next_id(project),
+                    title='Issue %d' % i, author=author)
+            if i % 3:
+                issue.due_date = timezone.now()
+            issue.save()
+            if i % 2:
+                # same comment count and last activity for several issues
+                Event(issue=issue, author=author, code=Event.COMMENT).save()
+        # pages from the cached ids, then from keyset queries
+        for filter in ('*', 'is:unread'):
+            for sort in SORT_VALUES:
+                manager = IssueManager(project, filter, sort, user=author)
+                issues = list(manager.issues)
+                # walk forward then backward through the pages
+                pages = []
+                page = manager.get_page(5)
+                self.assertFalse(page.has_previous)
+                pages.append(list(page))
+                while page.has_next:
+                    # the issues and their labels
+                    with self.assertNumQueries(2):
+                        page = manager.get_page(5, after=page.next_cursor)
+                    pages.append(list(page))
+                self.assertEqual(sum(pages, []), issues, sort)
+                while page.has_previous:
+                    page = manager.get_page(5, before=page.previous_cursor)
+                    self.assertEqual(list(page), pages.pop(-2), sort)
+                self.assertEqual(len(pages), 1)
+        # invalid cursors give the first page
+        self.assertEqual(list(manager.get_page(5, after='1.x')), issues[:5])
+
+    def test_issue_list_cache(self):
+        project = Project.objects.get(name='project-1')
+        author = User.objects.get(username='admin')
+        ids, complete = IssueManager(project, 'is:open').cached_ids
+        self.assertTrue(complete)
+        with self.assertNumQueries(0):
+            self.assertEqual(IssueManager(project, 'is:open').cached_ids,
+                    (ids, complete))
+        # any change in the project invalidates the cached ids
+        issue = project.issues.get(pk=ids[0])
+        issue.closed = True
+        issue.save()
+        ids = IssueManager(project, 'is:open').cached_ids[0]
+        self.assertNotIn(issue.pk, ids)
+        issue = project.issues.get(pk=ids[-1])
+        Event(issue=issue, author=author, code=Event.COMMENT).save()
+        self.assertEqual(IssueManager(project, 'is:open').cached_ids[0][0],
+                issue.pk)
+        # but not changes in other projects
+        Project.objects.get(name='project-2').labels.first().save()
+        with self.assertNumQueries(0):
+            IssueManager(project, 'is:open').cached_ids
+
+    def test_paginator(self):
+        project = Project.objects.get(name='project-1')
+        author = User.objects.get(username='admin')
+        issue = project.issues.first()
+        for i in range(8):
+            Event(issue=issue, author=author, code=Event.COMMENT).save()
+        events = Event.objects.filter(issue__project=project).order_by('-pk')
+        total = events.count()
+        # without version, objects are counted each time
+        paginator = Paginator(events, 2)
+        self.assertEqual(paginator.count, total)
+        self.assertEqual(paginator.num_pages, (total + 1) // 2)
+        # counts are cached along with the version of the data
+        version = tracker_cache.get_version('issues', project.pk)
+        self.assertEqual(Paginator(events, 2, version=version).count, total)
+        with self.assertNumQueries(0):
+            self.assertEqual(Paginator(events, 2, version=version).count,
+                    total)
+        Event(issue=issue, author=author, code=Event.COMMENT).save()
+        version = tracker_cache.get_version('issues', project.pk)
+        self.assertEqual(Paginator(events, 2, version=version).count,
+                total + 1)
+
+    def test_projects_summary(self):
+        user = User.objects.get(username='user1')
+        projects = list(Project.objects.all())
+        issue = projects[0].issues.first()
+        issue.mark_as_read(user)
+        for issue in projects[0].issues.all()[1:]:
+            issue.mark_as_read(user)
+            Event(issue=issue, author=user, code=Event.COMMENT).save()
+        with self.assertNumQueries(1):
+            summary = Project.get_issues_summary(projects, user)
+        for project in projects:
+            issues = project.issues.all()
+            self.assertEqual(summary[project.pk], {
+                'open': issues.filter(closed=False).count(),
+                'closed': issues.filter(closed=True).count(),
+                'unread': len([issue for issue in issues
+                        if issue.have_unread_message(user)]),
+            })
+
+    def test_project_read_state(self):
+        project = Project.objects.get(name='project-1')
+        user = User.objects.get(username='user1')
+        issues = list(project.issues.all())
+        issues[0].mark_as_read(user)
+        project.mark_as_read(user)
+        # issue read states are now useless
+        self.assertFalse(ReadState.objects.filter(user=user,
+                issue__project=project).exists())
+
+        def unread():
+            issues = IssueManager(project, 'is:unread', user=user).issues
+            self.assertEqual(project.get_unread_issues_nb(user),
+                    issues.count())
+            return list(issues)
+        self.assertEqual(unread(), [])
+        for issue in issues:
+            self.assertFalse(issue.have_unread_message(user))
+            self.assertEqual(issue.get_unread_event_nb(user), 0)
+        self.assertEqual(Issue.get_unread_events_nb(issues, user), {})
+        # issues updated since are unread
+        Event(issue=issues[0], author=user, code=Event.COMMENT).save()
+        self.assertEqual(unread(), [issues[0]])
+        self.assertTrue(issues[0].have_unread_message(user))
+        self.assertEqual(issues[0].get_unread_event_nb(user), 1)
+        self.assertEqual(Issue.get_unread_events_nb(issues, user),
+                {issues[0].pk: 1})
+        issues[0].mark_as_read(user)
+        self.assertEqual(unread(), [])
+        # the update of the project read state, the cleaning of the issue
+        # read states and the reset of the unread counter
+        with self.assertNumQueries(3):
+            project.mark_as_read(user)
+
+    def test_issue_unread_events(self):
+        project = Project.objects.get(name='project-1')
+        user = User.objects.get(username='user1')
+        issues = list(project.issues.all())
+        issues[0].mark_as_read(user)
+        Event(issue=issues[0], author=user, code=Event.COMMENT).save()
+        with self.assertNumQueries(1):
+            unread = Issue.get_unread_events_nb(issues, user)
+        for issue in issues:
+            self.assertEqual(unread.get(issue.pk, 0),
+                    issue.get_unread_event_nb(user))
+        self.assertEqual(unread[issues[0].pk], 1)
+
+    def test_unread_counters(self):
+        call_command('repair_unread_counters')
+        projects = list(Project.objects.all())
+        users = list(User.objects.all())
+
+        def check():
+            for user in users:
+                summary = Project.get_issues_summary(projects, user)
+                counts = ProjectUnreadCounter.get_counts(
+                    [project.pk for project in projects], user)
+                total = 0
+                for project in projects:
+                    unread = counts[project.pk]
+                    self.assertEqual(unread, summary[project.pk]['unread'])
+                    total += unread
+                self.assertEqual(ProjectUnreadCounter.get_total(
+                    Project.objects.all(), user), total)
+        check()
+        project = Project.objects.get(name='project-1')
+        user = User.objects.get(username='user1')
+        issues = list(project.issues.all())
+        issues[0].mark_as_read(user)
+        check()
+        Event(issue=issues[0], author=user, code=Event.COMMENT).save()
+        Event(issue=issues[1], author=user, code=Event.COMMENT).save()
+        check()
+        # no counter for the users who never read the project
+        self.assertEqual(ProjectUnreadCounter.objects.filter(project=project)
+                .count(), ReadState.objects.filter(issue__project=project)
+                .values('user').distinct().count())
+        issues[1].mark_as_read(user)
+        check()
+        project.mark_as_read(user)
+        check()
+        # counters which drifted below the issues read are reset, and logged
+        Event(issue=issues[1], author=user, code=Event.COMMENT).save()
+        counters = ProjectUnreadCounter.objects.filter(project=project,
+                user=user)
+        counters.update(issues=0)
+        with self.assertLogs('tracker.models', 'WARNING'):
+            Issue.objects.get(pk=issues[1].pk).mark_as_read(user)
+        self.assertEqual(counters.get().issues, 0)
+        check()
+        issue = Issue(title='new', author=user, project=project,
+                id=Issue.next_id(project))
+        issue.save()
+        issue.description = 'description'
+        check()
+        issues[0].delete()
+        check()
+
+    def test_read_states_upsert(self):
+        project = Project.objects.get(name='project-1')
+        user = User.objects.get(username='user1')
+        issues = list(project.issues.all()[:2])
+        issues[0].mark_as_read(user)
+        # the read date and the upsert, the issue being already read
+        with self.assertNumQueries(2):
+            issues[0].mark_as_read(user)
+        lastread = issues[0].get_lastread(user)
+        earlier = lastread - timezone.timedelta(days=1)
+        # the dates of the issues and of the reads, the upsert, and the
+        # update of the unread counter
+        with self.assertNumQueries(5):
+            ReadState.bulk_upsert([
+                (issues[0].pk, project.pk, user.pk, earlier),
+                (issues[1].pk, project.pk, user.pk, earlier),
+            ])
+        # older dates are ignored
+        self.assertEqual(issues[0].get_lastread(user), lastread)
+        self.assertEqual(issues[1].get_lastread(user), earlier)
+        # same with the ORM, for databases without upserts
+        issues[1].readstates.all().delete()
+        ReadState.upsert(issues[0].pk, user.pk, earlier)
+        ReadState.upsert(issues[1].pk, user.pk, earlier)
+        self.assertEqual(issues[0].get_lastread(user), lastread)
+        self.assertEqual(issues[1].get_lastread(user), earlier)
+
+    def test_event_descriptions(self):
+        project = Project.objects.get(name='project-1')
+        user = User.objects.get(username='user1')
+        issue = project.issues.first()
+        label = project.labels.first()
+        deleted = Label.objects.create(project=project, name='deleted')
+        milestone = Milestone.objects.create(project=project, name='v3')
+        issue.add_label(user, label)
+        issue.remove_label(user, label)
+        issue.add_label(user, deleted)
+        deleted.delete()
+        issue.add_milestone(user, milestone)
+        issue.remove_milestone(user, milestone)
+        events = list(issue.events.all())
+        # the labels of all events at once
+        with self.assertNumQueries(1):
+            Event.load_labels(events)
+            descriptions = [str(event) for event in events]
+            activities = [event.activity() for event in events]
+        link = '<a href="%s" class="label" style="%s">%s</a>' % (
+            label.url, label.style, label)
+        self.assertIn('added the %s label' % link, descriptions)
+        self.assertIn('removed the %s label to issue' % link, activities)
+        self.assertIn('added a deleted label', descriptions)
+        link = ('<span class="glyphicon glyphicon-road"></span> '
+                '<a href="%s"><b>v3</b></a>' % milestone.url)
+        self.assertIn('added this to the %s milestone' % link, descriptions)
+        self.assertIn('removed from the %s milestone the issue' % link,
+                activities)
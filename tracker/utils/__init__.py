@@ -1,5 +1,5 @@
 from django.utils.safestring import mark_safe
-from django.db.models import Q
+from django.db.models import Q, Exists
 from django.conf import settings
 from django.contrib.sites.models import Site
 from django.urls import reverse
@@ -12,11 +12,12 @@ import hashlib
 from tracker.models import Project
 from tracker.mdx.mdx_issue import IssueExtension
 from tracker.mdx.mdx_login import LoginExtension
-from permissions.models import GlobalPermission
-from permissions.models import PermissionModel as PermModel
+from permissions.models import GlobalPermission, ProjectPermission
+from permissions import cache as perms_cache
 
 
 from .issue_manager import IssueManager
+from .paginator import Paginator
 
 
 __all__ = ['granted_project', 'markdown_to_html', 'get_message_id'
@@ -24,44 +25,46 @@ __all__ = ['granted_project', 'markdown_to_html', 'get_message_id'
 
 
 def granted_projects(user):
-    if user.is_authenticated and user.is_staff:
-        return Project.objects.all()
-    elif user.is_authenticated:
-        teams = user.teams.values_list('id')
-        groups = user.groups.values_list('id')
-        # check for a global permission allowing access
-        if GlobalPermission.objects.filter(access_project=True) \
-                .filter(
-                    # directly
-                    Q(grantee_type=PermModel.GRANTEE_USER,
-                        grantee_id=user.id)
-                    # through a group
-                    | Q(grantee_type=PermModel.GRANTEE_GROUP,
-                        grantee_id__in=groups)
-                    # through a team
-                    | Q(grantee_type=PermModel.GRANTEE_TEAM,
-                        grantee_id__in=teams)
-                ).exists():
-            return Project.objects.all()
-        # searching project reachable throught project permission
-        else:
-            # public project
-            query = Q(access=Project.ACCESS_PUBLIC)
-            # project reserved to logged users
-            query |= Q(access=Project.ACCESS_REGISTERED)
-            # access granted through a team
-            query |= Q(permissions__grantee_type=PermModel.GRANTEE_TEAM,
-                    permissions__grantee_id__in=teams)
-            # access granted through a group
-            query |= Q(permissions__grantee_type=PermModel.GRANTEE_GROUP,
-                    permissions__grantee_id__in=groups)
-            # access granted by specific permission
-            query |= Q(permissions__grantee_type=PermModel.GRANTEE_USER,
-                    permissions__grantee_id=user.id)
-            return Project.objects.filter(query).distinct()
-    else:
+    return Project.objects.filter(id__in=granted_project_ids(user))
+
+
+def granted_project_ids(user):
+    """
+    Return the set of the ids of the projects the user can access.
+
+    The set is shared between processes through the permissions cache and
+    memoized on the user object, so that every consumer of the request
+    (middleware, views, templates) uses the same computed result.
+    """
+    return perms_cache.get_user_value(user, 'projects',
+            lambda: set(resolve_granted_projects(user)
+                    .values_list('id', flat=True)))
+
+
+def resolve_granted_projects(user):
+    """
+    Return a queryset of the projects the user can access, evaluated in a
+    single query whatever the way access is granted.
+    """
+    if not user.is_authenticated:
         # only public projects
         return Project.objects.filter(access=Project.ACCESS_PUBLIC)
+    elif user.is_staff:
+        return Project.objects.all()
+    # a global permission allowing access to every project
+    global_access = GlobalPermission.objects.granted_to(user)
+    global_access = global_access.granting('access_project')
+    # any permission on a project allows access to it, whether it is
+    # granted directly, through a group or through a team
+    project_perms = ProjectPermission.objects.granted_to(user)
+    query = Q(global_access=True)
+    # public project
+    query |= Q(access=Project.ACCESS_PUBLIC)
+    # project reserved to logged users
+    query |= Q(access=Project.ACCESS_REGISTERED)
+    query |= Q(id__in=project_perms.values('project'))
+    projects = Project.objects.annotate(global_access=Exists(global_access))
+    return projects.filter(query)
 
 
 def markdown_to_html(text, project, absolute_url=False):
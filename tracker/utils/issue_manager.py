@@ -1,14 +1,23 @@
 from __future__ import unicode_literals
 
-from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Max, Count, F, Q, OuterRef, Subquery, Exists
-
-from tracker.models import Label, Milestone, ReadState, Event
+from django.conf import settings
+from django.db.models import F, Q, Count, Value
+from django.db.models import CharField, IntegerField, DateTimeField
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from tracker.models import Issue, Label, Milestone, ReadState
+from tracker import cache as tracker_cache
 from accounts.models import User
 
 import shlex
+import hashlib
+import operator
+from functools import reduce
+from datetime import datetime, time, timedelta
 from sys import version_info as python_version
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
 
 
 STATUS_DEFAULT = 'is:open'
@@ -27,10 +36,38 @@ SORT_VALUES = OrderedDict([
         ('oldest', 'Oldest'),
         ('most-urgent', 'Most urgent'),
         ('least-urgent', 'Least urgent'),
-#        ('most-commented', 'Most commented'),
-#        ('least-commented', 'Least commented'),
+        ('most-commented', 'Most commented'),
+        ('least-commented', 'Least commented'),
     ])
 
+# Columns ordering the issues for each sort, as (column, descending) pairs.
+# None of them can be null, so that cursors are compared as plain tuples.
+# The primary key is appended to make the ordering total, as required by
+# the keyset pagination.
+SORT_FIELDS = {
+    'recently-updated': [('last_activity', True)],
+    'least-recently-updated': [('last_activity', False)],
+    'newest': [('opened_at', True)],
+    'oldest': [('opened_at', False)],
+    'most-urgent': [('due', False), ('opened_at', False)],
+    'least-urgent': [('due', True), ('opened_at', True)],
+    'most-commented': [('comment_count', True), ('opened_at', True)],
+    'least-commented': [('comment_count', False), ('opened_at', True)],
+}
+for fields in SORT_FIELDS.values():
+    fields.append(('primarykey', fields[-1][1]))
+
+# Sort columns computed from the fields of the issues.
+SORT_EXPRESSIONS = {
+    # issues without due date are the least urgent
+    'due': lambda: Coalesce('due_date', Value(get_max_date()),
+                            output_field=DateTimeField()),
+}
+
+# Ids of issues cached at most for each filter and sort, pages beyond them
+# being fetched with keyset queries.
+CACHED_IDS = 5000
+
 
 def shell_split(cmd):
 
@@ -47,7 +84,7 @@ def shell_split(cmd):
 
 def get_filter_value(key, value):
 
-    if key == 'author':
+    if key == 'author' or key == 'assignee':
         return value.username
     elif key == 'label':
         return value.quotted_name
@@ -59,50 +96,232 @@ def get_filter_value(key, value):
         return str(value)
 
 
-class IssueManager:
+def select_displayed(issues):
+    # everything displayed for each issue of the list
+    issues = issues.select_related('author', 'milestone')
+    return issues.prefetch_related('labels')
+
+
+def annotate_sort_columns(issues, fields):
+    """
+    Annotate the issues with the computed columns of fields, so that their
+    cursors can be built.
+    """
+    for name, descending in fields:
+        if name in SORT_EXPRESSIONS:
+            issues = issues.annotate(**{name: SORT_EXPRESSIONS[name]()})
+    return issues
+
+
+def sort_issues(issues, fields):
+    """
+    Order the issues as described by fields.
+    """
+    ordering = []
+    for name, descending in fields:
+        if name in SORT_EXPRESSIONS:
+            # not by reference, the annotation being dropped by values()
+            column = SORT_EXPRESSIONS[name]()
+        else:
+            column = F(name)
+        if descending:
+            ordering.append(column.desc())
+        else:
+            ordering.append(column.asc())
+    return annotate_sort_columns(issues, fields).order_by(*ordering)
 
-    def __init__(self, project, filter=None, sort=None, user=None):
 
-        self.project = project
-        self.filter = filter or STATUS_DEFAULT
-        self.sort = sort or SORT_DEFAULT
-        self.user = user
+def reverse_fields(fields):
+    return [(name, not descending) for name, descending in fields]
 
-        self.status = None
-        self.error = None
 
-        self.labels = Label.objects.filter(project=project, deleted=False)
-        self.not_used_labels = self.labels
+def get_keyset_filter(fields, values):
+    """
+    Build a query on the rows ordered strictly after the row with the given
+    values, the rows being ordered as described by fields: the tuple of
+    their columns compares greater (or lower, for descending columns).
+    """
+    clauses = []
+    equal = Q()
+    for (name, descending), value in zip(fields, values):
+        if descending:
+            clauses.append(equal & Q(**{name + '__lt': value}))
+        else:
+            clauses.append(equal & Q(**{name + '__gt': value}))
+        equal &= Q(**{name: value})
+    return reduce(operator.or_, clauses)
 
-        self.milestones = Milestone.objects.filter(project=project, deleted=False)
-        self.not_used_milestones = self.milestones
 
-        self._constraints = []
-        self._filters = []
-        self.unread = False
+def get_epoch():
+    if settings.USE_TZ:
+        return datetime(1970, 1, 1, tzinfo=timezone.utc)
+    else:
+        return datetime(1970, 1, 1)
 
-        for constraint in shell_split(self.filter):
 
-            if constraint == '*':
-                try:
-                    self.handle_is(constraint)
-                except ValueError as e:
-                    self.error = str(e)
-                    break
-                continue
+def get_max_date():
+    if settings.USE_TZ:
+        return datetime(9999, 12, 31, tzinfo=timezone.utc)
+    else:
+        return datetime(9999, 12, 31)
+
+
+def encode_cursor(values):
+    """
+    Encode the values of the sort columns in an URL-safe string, dates
+    being given as microseconds since the epoch.
+    """
+    encoded = []
+    for value in values:
+        if isinstance(value, datetime):
+            delta = value - get_epoch()
+            value = (delta.days * 86400 + delta.seconds) * 10**6
+            value += delta.microseconds
+        encoded.append(str(value))
+    return '.'.join(encoded)
+
+
+def decode_cursor(fields, cursor):
+    """
+    Decode a cursor built by encode_cursor, raising ValueError if it is
+    malformed.
+    """
+    encoded = cursor.split('.')
+    if len(encoded) != len(fields):
+        raise ValueError("Invalid cursor.")
+    values = []
+    for (name, descending), value in zip(fields, encoded):
+        value = int(value)
+        if name in SORT_EXPRESSIONS:
+            field = SORT_EXPRESSIONS[name]().output_field
+        else:
+            field = Issue._meta.get_field(name)
+        if field.get_internal_type() == 'DateTimeField':
+            value = get_epoch() + timedelta(microseconds=value)
+        values.append(value)
+    return values
 
-            args = constraint.split(':')
 
-            if len(args) != 2:
-                self.error = 'There is a syntax error in your filter.'
-                break
+class IssuePage:
+
+    """
+    A page of issues delimited by the values of the sort columns of its
+    first and last issues rather than by an offset, so that fetching a page
+    costs the same whatever its position in the list.
+    """
+
+    def __init__(self, manager, object_list, has_previous, has_next):
+        self.manager = manager
+        self.object_list = object_list
+        self.has_previous = has_previous
+        self.has_next = has_next
 
-            key = args[0]
-            value = args[1]
+    def __iter__(self):
+        return iter(self.object_list)
 
-            if key == '':
-                continue
+    def __len__(self):
+        return len(self.object_list)
 
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous:
+            return self.manager.get_cursor(self.object_list[0])
+
+    @property
+    def next_cursor(self):
+        if self.has_next:
+            return self.manager.get_cursor(self.object_list[-1])
+
+
+Constraint = namedtuple('Constraint', ['key', 'value'])
+
+
+def parse_filter(filter):
+    """
+    Parse the filter into a list of constraints, stopping at the first
+    syntax error. Return the constraints parsed and the error, if any.
+    """
+    constraints = []
+    try:
+        tokens = shell_split(filter)
+    except ValueError:  # e.g. no closing quotation
+        return constraints, 'There is a syntax error in your filter.'
+    for token in tokens:
+        if token == '*':
+            constraints.append(Constraint('is', '*'))
+            continue
+        args = token.split(':')
+        if len(args) != 2:
+            return constraints, 'There is a syntax error in your filter.'
+        if args[0] == '':
+            continue
+        constraints.append(Constraint(args[0], args[1]))
+    return constraints, None
+
+
+def get_date_filter(key, field, value, choices=''):
+    """
+    Build the query for '<date' (before the day) and '>date' (after the
+    day) values, comparing the field directly to the bounds of the day so
+    that its index can be used.
+    """
+    error = "The keyword '%s' must be followed by %s'<YYYY-MM-DD' " \
+            "or '>YYYY-MM-DD'." % (key, choices)
+    try:
+        day = parse_date(value[1:])
+    except ValueError:  # e.g. month 13
+        day = None
+    if day is None or value[0] not in '<>':
+        raise ValueError(error)
+    if value[0] == '<':
+        bound = datetime.combine(day, time.min)
+        lookup = '__lt'
+    else:
+        bound = datetime.combine(day + timedelta(days=1), time.min)
+        lookup = '__gte'
+    if settings.USE_TZ:
+        bound = timezone.make_aware(bound)
+    return Q(**{field + lookup: bound})
+
+
+class FilterPlan:
+
+    """
+    A filter compiled for a project: its status, the constraints kept for
+    building links and the queries on the issues.
+
+    Names are resolved to ids with one query per kind of name, and only ids
+    are kept, so that plans can be cached, see get_filter_plan.
+    """
+
+    def __init__(self, project, constraints, error=None):
+
+        self.status = None
+        self.error = None
+        self.unread = False
+        self.constraints = []
+        self.filters = []
+        # kept apart so that issues can be counted for each status
+        self.status_filter = None
+        # ids of the labels and milestones used by the filter
+        self.labels = set()
+        self.milestones = set()
+
+        self.ids = {
+            'label': self.resolve(constraints, 'label',
+                    Label.objects.filter(project=project, deleted=False),
+                    'name'),
+            'milestone': self.resolve(constraints, 'milestone',
+                    Milestone.objects.filter(project=project, deleted=False),
+                    'name'),
+            'user': self.resolve(constraints, ('author', 'assignee'),
+                    User.objects.all(), 'username'),
+        }
+
+        for key, value in constraints:
             handler = getattr(self, 'handle_%s' % key, None)
             if not handler:
                 self.error = "Unknown '%s' filtering criterion." % key
@@ -114,11 +333,23 @@ class IssueManager:
                 self.error = str(e)
                 break
             if not skip and key != 'is': # status is stored in self.status
-                self._constraints += [(key, value)]
+                self.constraints += [(key, value)]
+        else:
+            self.error = error
 
         if not self.status:
             self.handle_is(STATUS_DEFAULT.split(':')[1])
 
+    @staticmethod
+    def resolve(constraints, keys, queryset, field):
+        if not isinstance(keys, tuple):
+            keys = (keys,)
+        names = set(value for key, value in constraints if key in keys)
+        if not names:
+            return {}
+        return dict(queryset.filter(**{field + '__in': names})
+                .values_list(field, 'id'))
+
     def handle_is(self, value):
 
         if self.status:
@@ -129,10 +360,10 @@ class IssueManager:
             self.status = '*'
         elif value == 'open':
             self.status = 'is:open'
-            self._filters.append(Q(closed=False))
+            self.status_filter = Q(closed=False)
         elif value == 'close':
             self.status = 'is:close'
-            self._filters.append(Q(closed=True))
+            self.status_filter = Q(closed=True)
         elif value == 'unread':
             self.status = 'is:unread'
             self.unread = True
@@ -142,77 +373,323 @@ class IssueManager:
 
     def handle_label(self, value):
 
-        try:
-            label = self.labels.get(name=value)
-        except ObjectDoesNotExist:
+        if value not in self.ids['label']:
             raise ValueError("The label '%s' does not exist "
                              "or has been deleted." % value)
-        if self.not_used_labels.filter(name=value).exists():
-            self._filters.append(Q(labels=label))
-            self.not_used_labels = self.not_used_labels.exclude(pk=label.pk)
-        else:
+        label = self.ids['label'][value]
+        if label in self.labels:
             return True
+        self.filters.append(Q(labels=label))
+        self.labels.add(label)
 
     def handle_milestone(self, value):
-        try:
-            milestone = self.milestones.get(name=value)
-        except ObjectDoesNotExist:
+        if value not in self.ids['milestone']:
             raise ValueError("The milestone '%s' does not exist." % value)
-        if self.not_used_milestones.filter(name=value).exists():
-            self._filters.append(Q(milestone=milestone))
-            self.not_used_milestones = self.not_used_milestones\
-                    .exclude(pk=milestone.pk)
-        else:
+        milestone = self.ids['milestone'][value]
+        if milestone in self.milestones:
             return True
+        self.filters.append(Q(milestone=milestone))
+        self.milestones.add(milestone)
 
     def handle_due(self, value):
         if value == 'yes':
-            self._filters.append(Q(due_date__isnull=False))
+            self.filters.append(Q(due_date__isnull=False))
         elif value == 'no':
-            self._filters.append(Q(due_date__isnull=True))
+            self.filters.append(Q(due_date__isnull=True))
         else:
-            raise ValueError("The keyword 'due' must be followed "
-                             "by 'yes' or 'no'.")
+            self.filters.append(get_date_filter('due', 'due_date', value,
+                    "'yes', 'no', "))
+
+    def handle_updated(self, value):
+        self.filters.append(get_date_filter('updated', 'last_activity',
+                value))
+
+    def handle_opened(self, value):
+        self.filters.append(get_date_filter('opened', 'opened_at', value))
 
     def handle_author(self, value):
-        try:
-            author = User.objects.get(username=value)
-        except ObjectDoesNotExist:
+        if value not in self.ids['user']:
+            raise ValueError("The user '%s' does not exist." % value)
+        self.filters.append(Q(author=self.ids['user'][value]))
+
+    def handle_assignee(self, value):
+        if value not in self.ids['user']:
             raise ValueError("The user '%s' does not exist." % value)
-        self._filters.append(Q(author=author))
+        self.filters.append(Q(assignee=self.ids['user'][value]))
+
+    def handle_no(self, value):
+        if value == 'label':
+            self.filters.append(Q(labels__isnull=True))
+        elif value == 'milestone':
+            self.filters.append(Q(milestone__isnull=True))
+        elif value == 'assignee':
+            self.filters.append(Q(assignee__isnull=True))
+        else:
+            raise ValueError("The keyword 'no' must be followed by "
+                             "'label', 'milestone' or 'assignee'.")
+
+
+def get_filter_plan(project, filter):
+    """
+    Return the plan of the filter on the project, compiling it only if it
+    is not in the cache.
+
+    Plans are keyed by the constraints of the filter, so that filters
+    differing only by spaces or quotes share the same plan, and by the
+    versions of the labels, milestones and users they refer to.
+    """
+    constraints, error = parse_filter(filter)
+    normalized = ' '.join('%s:%s' % constraint for constraint in constraints)
+    if error:
+        normalized += '\0' + error
+    digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+    key = 'tracker:filter:%s:%s:%s:%s' % (
+        project.pk, tracker_cache.get_version('filters'),
+        tracker_cache.get_version('filters', project.pk), digest)
+    cache = tracker_cache.get_cache()
+    plan = cache.get(key)
+    if plan is None:
+        plan = FilterPlan(project, constraints, error)
+        cache.set(key, plan)
+    return plan
 
 
-    @property
-    def issues(self):
-        issues = self.project.issues
+class IssueManager:
+
+    def __init__(self, project, filter=None, sort=None, user=None):
+
+        self.project = project
+        self.filter = filter or STATUS_DEFAULT
+        self.sort = sort or SORT_DEFAULT
+        self.user = user
+
+        plan = get_filter_plan(project, self.filter)
+
+        self.status = plan.status
+        self.error = plan.error
+        self.unread = plan.unread
+        self._constraints = plan.constraints
+        self._filters = plan.filters
+        self._status_filter = plan.status_filter
+
+        self.labels = Label.objects.filter(project=project, deleted=False)
+        self.not_used_labels = self.labels.exclude(pk__in=plan.labels)
+
+        self.milestones = Milestone.objects.filter(project=project,
+                                                   deleted=False)
+        self.not_used_milestones = self.milestones.exclude(
+            pk__in=plan.milestones)
+
+    def annotate_lastread(self, issues):
+        return ReadState.annotate_lastread(issues, self.user)
+
+    def filter_issues(self, status=True):
+        """
+        Return the issues matching the filter, ignoring its status if
+        status is False.
+        """
+        issues = self.project.issues.all()
         for filter in self._filters:
             issues = issues.filter(filter)
 
-        if self.unread:
-            datelastread = ReadState.objects.filter(issue=OuterRef('pk'),user=self.user)
-            datelastupdate = Event.objects.filter(issue=OuterRef('pk')).order_by('-date')
-            issues = issues.annotate(datelastupdate=Subquery(datelastupdate.values('date')[:1]), \
-                                     datelastread=Subquery(datelastread.values('lastread'))) \
-                           .filter(Q(datelastread__isnull=True) | Q(datelastread__lt=F('datelastupdate')))
-
-        if self.sort == 'newest':
-            issues = issues.order_by('-opened_at')
-        elif self.sort == 'oldest':
-            issues = issues.order_by('opened_at')
-        elif self.sort == 'most-urgent':
-            issues = issues.annotate(null_due_date=Count('due_date'))\
-                    .order_by('-null_due_date', 'due_date', 'opened_at')
-        elif self.sort == 'least-urgent':
-            issues = issues.order_by('-due_date', '-opened_at')
-        elif self.sort == 'least-recently-updated':
-            issues = issues.annotate(last_activity=Max('events__date'))\
-                    .order_by('last_activity')
-        else: # recently-updated
-            issues = issues.annotate(last_activity=Max('events__date'))\
-                    .order_by('-last_activity')
+        if status and self._status_filter is not None:
+            issues = issues.filter(self._status_filter)
+
+        if status and self.unread:
+            issues = self.annotate_lastread(issues)
+            issues = issues.filter(ReadState.unread('last_activity'))
 
         return issues
 
+    @property
+    def issues(self):
+        issues = self.filter_issues()
+
+        issues = sort_issues(issues, self.sort_fields)
+
+        return select_displayed(issues)
+
+    @property
+    def facets(self):
+        """
+        Count the issues matching the filter for each status, and the listed
+        issues for each label and milestone, as a dict of dicts keyed by
+        'status' (then by status value), 'label' and 'milestone' (then by
+        id).
+
+        The counts are computed with a single query made of the union of one
+        grouped query per kind of facet, and cached until the next change in
+        the project. Unread issues depend on the user and are counted apart.
+        """
+        if hasattr(self, '_facets'):
+            return self._facets
+
+        if self.unread:
+            # listed issues depend on the user
+            facets = self.count_facets()
+        else:
+            key = self.get_cache_key('facets')
+            cache = tracker_cache.get_cache()
+            facets = cache.get(key)
+            if facets is None:
+                facets = self.count_facets()
+                cache.set(key, facets)
+
+        if self.user is not None and self.user.is_authenticated:
+            issues = self.annotate_lastread(self.filter_issues(status=False))
+            facets['status']['is:unread'] = issues.filter(
+                ReadState.unread('last_activity')).count()
+
+        self._facets = facets
+        return facets
+
+    def count_facets(self):
+
+        # issues of every status
+        issues = self.filter_issues(status=False).order_by()
+        status = issues \
+            .annotate(facet=Value('status', output_field=CharField())) \
+            .annotate(key=Cast('closed', IntegerField())) \
+            .values('facet', 'key') \
+            .annotate(count=Count('pk'))
+
+        # listed issues
+        issues = self.filter_issues().order_by()
+        labels = Issue.labels.through.objects \
+            .filter(issue__in=issues.values('pk')) \
+            .annotate(facet=Value('label', output_field=CharField())) \
+            .annotate(key=F('label')) \
+            .values('facet', 'key') \
+            .annotate(count=Count('issue'))
+        milestones = issues.filter(milestone__isnull=False) \
+            .annotate(facet=Value('milestone', output_field=CharField())) \
+            .annotate(key=F('milestone')) \
+            .values('facet', 'key') \
+            .annotate(count=Count('pk'))
+
+        facets = {'status': dict((status, 0) for status in STATUS_VALUES),
+                  'label': {}, 'milestone': {}}
+        for row in status.union(labels, milestones, all=True):
+            if row['facet'] == 'status':
+                if row['key']:
+                    facets['status']['is:close'] += row['count']
+                else:
+                    facets['status']['is:open'] += row['count']
+                facets['status']['*'] += row['count']
+            else:
+                facets[row['facet']][row['key']] = row['count']
+        return facets
+
+    @property
+    def sort_fields(self):
+        return SORT_FIELDS.get(self.sort, SORT_FIELDS[SORT_DEFAULT])
+
+    def get_cursor(self, issue):
+        return encode_cursor([getattr(issue, name)
+                for name, descending in self.sort_fields])
+
+    def get_cache_key(self, name):
+        """
+        Key of the named result of the filter, valid until the next change
+        in the project.
+        """
+        if not hasattr(self, '_cache_prefix'):
+            filter = ' '.join([self.status] + ['%s:%s' % constraint
+                    for constraint in self._constraints])
+            self._cache_prefix = 'tracker:issues:%s:%s:%s' % (
+                self.project.pk,
+                tracker_cache.get_version('issues', self.project.pk),
+                hashlib.sha1(filter.encode('utf-8')).hexdigest())
+        return '%s:%s' % (self._cache_prefix, name)
+
+    @property
+    def cached_ids(self):
+        """
+        The ids of the first CACHED_IDS issues matching the filter, in
+        order, and whether there is no other issue, as a tuple.
+
+        They are cached until the next change in the project, except for
+        filters on unread issues, which depend on the user (None is
+        returned then).
+        """
+        if self.unread:
+            return None
+        if not hasattr(self, '_cached_ids'):
+            key = self.get_cache_key(self.sort)
+            cache = tracker_cache.get_cache()
+            self._cached_ids = cache.get(key)
+            if self._cached_ids is None:
+                ids = list(sort_issues(self.filter_issues(),
+                        self.sort_fields)
+                        .values_list('pk', flat=True)[:CACHED_IDS + 1])
+                self._cached_ids = (ids[:CACHED_IDS], len(ids) <= CACHED_IDS)
+                cache.set(key, self._cached_ids)
+        return self._cached_ids
+
+    def get_cached_page(self, size, after, values):
+        """
+        Return the page of issues from the cached ids, or None if it is
+        beyond them.
+        """
+        ids, complete = self.cached_ids
+        if values is None:
+            start = 0
+        else:
+            try:
+                index = ids.index(values[-1])  # the primary key
+            except ValueError:
+                return None
+            if after:
+                start = index + 1
+            else:
+                # no issue before this page: show the first one, full
+                start = max(index - size, 0)
+        end = start + size
+        if end >= len(ids) and not complete:
+            return None
+        issues = annotate_sort_columns(self.project.issues.all(),
+                self.sort_fields)
+        issues = select_displayed(issues).in_bulk(ids[start:end])
+        issues = [issues[pk] for pk in ids[start:end] if pk in issues]
+        return IssuePage(self, issues, start > 0, end < len(ids))
+
+    def get_page(self, size, after=None, before=None):
+        """
+        Return the page of size issues following the issue identified by
+        the after cursor, or preceding the one identified by the before
+        cursor, or the first page if none is given (or if it is invalid).
+
+        Pages are taken from the cached ids of the issues if possible, only
+        the issues of the page being fetched, and fetched with a keyset
+        query otherwise.
+        """
+        fields = self.sort_fields
+        issues = self.issues
+        cursor = after or before
+        values = None
+        if cursor:
+            try:
+                values = decode_cursor(fields, cursor)
+            except ValueError:
+                cursor = None
+        if self.cached_ids is not None:
+            page = self.get_cached_page(size, cursor and after, values)
+            if page is not None:
+                return page
+        if not cursor:
+            issues = list(issues[:size + 1])
+            return IssuePage(self, issues[:size], False, len(issues) > size)
+        if after:
+            issues = list(issues.filter(get_keyset_filter(fields, values))
+                    [:size + 1])
+            return IssuePage(self, issues[:size], True, len(issues) > size)
+        issues = list(issues.filter(get_keyset_filter(
+            reverse_fields(fields), values)).reverse()[:size + 1])
+        if len(issues) <= size:
+            # no issue before this page: show the first one, full
+            return self.get_page(size)
+        return IssuePage(self, issues[size - 1::-1], True, True)
+
     @property
     def resettable(self):
         return bool(len(self._constraints))
@@ -238,6 +715,10 @@ class IssueManager:
         else:
             reset = False
 
+        # pages are only kept when explicitly requested
+        after = kwargs.pop('after', None)
+        before = kwargs.pop('before', None)
+
         if status != STATUS_DEFAULT or \
                 ( not reset and ( len(self._constraints) or len(kwargs) ) ):
             if url:
@@ -268,4 +749,12 @@ class IssueManager:
                 url += 'sort='
             url += sort
 
+        if after or before:
+            if url:
+                url += '&'
+            if after:
+                url += 'after=' + after
+            else:
+                url += 'before=' + before
+
         return url
@@ -0,0 +1,51 @@
+from __future__ import unicode_literals
+
+from django.core import paginator
+from django.core.exceptions import EmptyResultSet
+from django.utils.functional import cached_property
+
+from tracker import cache as tracker_cache
+
+import hashlib
+
+
+"""
+Counting the objects of a paginated list may cost as much as fetching the
+page itself. This paginator caches the count when the data version it
+depends on is known.
+"""
+
+
+__all__ = ['Paginator']
+
+
+class Paginator(paginator.Paginator):
+
+    """
+    Paginator caching the count of the objects.
+
+    If version is given, the count is cached under the query and this
+    version, which must change along with the objects (see tracker.cache).
+    Otherwise objects are counted as usual.
+    """
+
+    def __init__(self, object_list, per_page, version=None, **kwargs):
+        super(Paginator, self).__init__(object_list, per_page, **kwargs)
+        self.version = version
+
+    @cached_property
+    def count(self):
+        if self.version is None or not hasattr(self.object_list, 'query'):
+            return super(Paginator, self).count
+        try:
+            query = str(self.object_list.query)
+        except EmptyResultSet:
+            return 0
+        key = 'tracker:count:%s:%s' % (self.version,
+                hashlib.sha1(query.encode('utf-8')).hexdigest())
+        cache = tracker_cache.get_cache()
+        count = cache.get(key)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(key, count)
+        return count
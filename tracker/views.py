@@ -6,15 +6,17 @@ from django.contrib.sites.shortcuts import get_current_site
 from django.views.decorators.http import require_http_methods
 from django.conf import settings
 from django.urls import reverse
-from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
+from django.core.paginator import PageNotAnInteger, EmptyPage
 from django.http import HttpResponse, Http404
 from django.db.models import Max, Count
 
-from tracker.utils import markdown_to_html, IssueManager
+from tracker.utils import markdown_to_html, IssueManager, Paginator
 from tracker.utils.issue_manager import STATUS_VALUES, SORT_VALUES
 from tracker.forms import *
 from tracker.models import *
 from tracker.notifications import *
+from tracker import cache as tracker_cache
+from tracker import readstates
 from accounts.models import User
 from permissions.models import ProjectPermission
 from permissions.decorators import project_perm_required
@@ -78,19 +80,22 @@ def settings_list(request):
 
 def project_list(request, archived=False):
 
-    if not archived and not request.projects.exists():
+    # evaluate request.projects only once, the project menu uses it too
+    if not archived and not request.projects:
 
         if request.user.has_perm('create_project'):
             messages.info(request, 'Start by creating a project.')
             return redirect('add-project')
 
-
-    read_state_projects = {}
-    for project in request.projects.all():
-        read_state_projects[project] = project.get_unread_issues_nb(request.user)
+    summary = Project.get_issues_summary(request.projects)
+    if request.user.is_authenticated:
+        unread = ProjectUnreadCounter.get_counts(summary.keys(),
+                request.user)
+        for project, issues in summary.items():
+            issues['unread'] = unread[project]
     c = {
         'archived': archived,
-        'read_state_projects': read_state_projects,
+        'summary': summary,
     }
 
     return render(request, 'tracker/project_list.html', c)
@@ -219,8 +224,7 @@ def project_unsubscribe(request, project):
 @login_required
 def project_mark_as_read(request, project):
 
-    for issue in project.issues.all():
-        issue.mark_as_read(request.user)
+    project.mark_as_read(request.user)
 
     next = request.GET.get('next')
     if next:
@@ -258,32 +262,23 @@ def issue_list(request, project):
                                 sort=request.GET.get('sort'),
                                 user=request.user)
 
-    issues = issuemanager.issues
-
     if issuemanager.error:
         messages.error(request, issuemanager.error)
 
-    if issues:
-        page = request.GET.get('page')
-        paginator = Paginator(issues,
-                get_current_site(request).settings.items_per_page)
-        try:
-            issues = paginator.page(page)
-        except PageNotAnInteger:
-            issues = paginator.page(1)
-        except EmptyPage:
-            issues = paginator.page(paginator.num_pages)
-    else:
-        paginator = None
+    issues = issuemanager.get_page(
+        get_current_site(request).settings.items_per_page,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'))
 
+    # unread events of the issues of the current page only
+    unread_events = Issue.get_unread_events_nb(issues, request.user)
     read_state_issues = {}
-    for issue in project.issues.all():
-        read_state_issues[issue] = issue.get_unread_event_nb(request.user)
+    for issue in issues:
+        read_state_issues[issue] = unread_events.get(issue.pk, 0)
 
     c = {
         'project': project,
         'issues': issues,
-        'paginator': paginator,
         'manager': issuemanager,
         'status': issuemanager.status,
         'status_values': STATUS_VALUES,
@@ -390,15 +385,24 @@ def issue_edit(request, project, issue=None):
 
 def issue_details(request, project, issue):
 
-    issue = get_object_or_404(Issue, project=project, id=issue)
+    issue = get_object_or_404(Issue.objects.select_related('author',
+            'milestone'), project=project, id=issue)
+    issue.project = project
 
-    labels = Label.objects.filter(project=project, deleted=False) \
-        .exclude(id__in=issue.labels.all().values_list('id'))
+    # labels and milestones link to the project, which is not loaded again
+    issue_labels = list(issue.labels.all())
+    for label in issue_labels:
+        label.project = project
+    labels = list(Label.objects.filter(project=project, deleted=False)
+            .exclude(id__in=[label.id for label in issue_labels]))
     milestones = Milestone.objects.filter(project=project)
     if issue.milestone:
+        issue.milestone.project = project
         milestones = milestones.exclude(name=issue.milestone.name)
+    milestones = list(milestones)
 
-    events = issue.events.all()
+    events = list(issue.events.select_related('author'))
+    Event.load_labels(events)
 
     if request.user.has_perm('create_comment', project):
         form = CommentForm(request.POST or None)
@@ -407,12 +411,13 @@ def issue_details(request, project, issue):
 
     c = {
         'labels': labels,
+        'issue_labels': issue_labels,
         'milestones': milestones,
         'project': project,
         'issue': issue,
         'events': events,
         'form': form,
-        'lastread' : issue.mark_as_read(request.user),
+        'lastread': readstates.mark_as_read(issue, request.user),
     }
 
     return render(request, 'tracker/issue_details.html', c)
@@ -784,10 +789,9 @@ def milestone_edit(request, project, name=None):
                 if name != form.cleaned_data['name']:
                     for i in milestone.issues.all():
                         event = Event(issue=i, author=request.user,
-                                code=Event.CHANGE_MILESTONE, args={
-                                    'old_milestone': name,
-                                    'new_milestone': form.cleaned_data['name']
-                                })
+                                code=Event.CHANGE_MILESTONE,
+                                old_milestone_name=name,
+                                milestone_name=form.cleaned_data['name'])
                         event.save()
                 form.save()
                 messages.success(request, 'Milestone modified successfully.')
@@ -864,19 +868,19 @@ def milestone_delete(request, project, name):
 def activity(request, project):
 
     events = Event.objects.filter(issue__project=project).order_by('-pk')
-
-    if events:
-        page = request.GET.get('page')
-        paginator = Paginator(events,
-                get_current_site(request).settings.items_per_page)
-        try:
-            events = paginator.page(page)
-        except PageNotAnInteger:
-            events = paginator.page(1)
-        except EmptyPage:
-            events = paginator.page(paginator.num_pages)
-    else:
-        paginator = None
+    events = events.select_related('author', 'issue__project')
+
+    page = request.GET.get('page')
+    paginator = Paginator(events,
+            get_current_site(request).settings.items_per_page,
+            version=tracker_cache.get_version('issues', project.pk))
+    try:
+        events = paginator.page(page)
+    except PageNotAnInteger:
+        events = paginator.page(1)
+    except EmptyPage:
+        events = paginator.page(paginator.num_pages)
+    Event.load_labels(events)
 
     return render(request, 'tracker/activity.html', {
         'project': project,